@@ -0,0 +1,361 @@
+"""
+Catalog aggregates (group-by summaries and histograms) over columnar copies
+of the albums and songs tables.
+
+Every numeric column is a contiguous typed array, and genres and artists are
+dictionary-encoded into small integer codes. The columns are loaded in one
+read and rebuilt only when the catalog version moves. Results are cached per
+build.
+
+Nothing loops over songs per request. Each album slot carries partial sums
+(count, sum, sum of squares, min, max) of its own metrics and of its songs'
+scores. A grouping sorts the album slots by a tuple of fields once per build,
+so every group, and every filter on those fields, is a contiguous run that
+sum/min/max/math.fsum summarise over array slices.
+"""
+import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from operator import mul
+
+from sqlalchemy import select
+
+from catalog import current_version, get_catalog_version
+from models import read_engine, AlbumDB, SongDB
+
+ALBUM_GROUPS = ("genre", "year", "artist")
+SONG_GROUPS = ("genre", "year", "artist", "album_id")
+ALBUM_METRICS = ("score", "personal", "mean")
+GROUP_SORTS = ("key", "count", "score", "spread")
+DEFAULT_BINS = 10
+MAX_BINS = 200
+MAX_CACHED_RESULTS = 256
+
+class Partials:
+    """count, sum, sum of squares, min and max per album slot, as parallel arrays."""
+
+    __slots__ = ("count", "total", "squares", "low", "high")
+
+    @classmethod
+    def of_values(cls, values: array) -> "Partials":
+        """One value per slot."""
+        partials = cls()
+        partials.count = array("l", [1]) * len(values)
+        partials.total = partials.low = partials.high = values
+        partials.squares = array("d", map(mul, values, values))
+        return partials
+
+    @classmethod
+    def of_runs(cls, values: array, starts: array, ends: array) -> "Partials":
+        """The run values[starts[i]:ends[i]] per slot i."""
+        partials = cls()
+        partials.count = array("l", map(int.__sub__, ends, starts))
+        partials.total, partials.squares, partials.low, partials.high = array("d"), array("d"), array("d"), array("d")
+        for start, end in zip(starts, ends):
+            run = values[start:end]
+            partials.total.append(math.fsum(run))
+            partials.squares.append(math.fsum(map(mul, run, run)))
+            partials.low.append(min(run, default=math.inf))
+            partials.high.append(max(run, default=-math.inf))
+        return partials
+
+    def permuted(self, order: array) -> "Partials":
+        partials = Partials()
+        done = {}
+        for name in self.__slots__:
+            column = getattr(self, name)
+            # of_values shares one array between total, low and high
+            if id(column) not in done:
+                done[id(column)] = array(column.typecode, map(column.__getitem__, order))
+            setattr(partials, name, done[id(column)])
+        return partials
+
+    def summary(self, start: int, end: int) -> tuple[int, dict | None]:
+        """Count and mean/min/max/stddev over slots start to end; None when the count is 0."""
+        count = sum(self.count[start:end])
+        if not count:
+            return 0, None
+        mean = math.fsum(self.total[start:end]) / count
+        variance = max(0.0, math.fsum(self.squares[start:end]) / count - mean * mean)
+        return count, {
+            "mean": round(mean, 4),
+            "min": min(self.low[start:end]),
+            "max": max(self.high[start:end]),
+            "stddev": round(math.sqrt(variance), 4),
+        }
+
+class Grouping:
+    """
+    Album slots sorted by a tuple of fields, with the offset where each run of
+    equal keys starts. Keys hold genre and artist codes, not names.
+    """
+
+    __slots__ = ("fields", "order", "keys", "offsets", "_partials")
+
+    def __init__(self, cols: "Columns", fields: tuple[str, ...]):
+        self.fields = fields
+        keys = list(zip(*(_key_column(cols, field) for field in fields)))
+        # sorted() is stable, so slots within a group stay in id order
+        self.order = array("l", sorted(range(len(keys)), key=keys.__getitem__))
+        self.keys, self.offsets = [], array("l")
+        for i, key in enumerate(map(keys.__getitem__, self.order)):
+            if not self.keys or key != self.keys[-1]:
+                self.keys.append(key)
+                self.offsets.append(i)
+        self.offsets.append(len(self.order))
+        self._partials = {}
+
+    def partials(self, cols: "Columns", name: str) -> Partials:
+        """cols.partials[name] in this grouping's order."""
+        found = self._partials.get(name)
+        if found is None:
+            found = self._partials[name] = cols.partials[name].permuted(self.order)
+        return found
+
+    def runs(self, wanted: tuple, at: int | None = None) -> list[tuple]:
+        """(key[at], start, end) of every group whose leading key fields equal wanted."""
+        width = len(wanted)
+        return [
+            (key[at] if at is not None else None, self.offsets[i], self.offsets[i + 1])
+            for i, key in enumerate(self.keys)
+            if key[:width] == wanted
+        ]
+
+class Columns:
+    """
+    The catalog as parallel arrays, one slot per album (in id order) or per
+    song (grouped by album, so each album's songs are one run).
+    """
+
+    __slots__ = (
+        "version", "album_id", "album_year", "album_genre", "album_artist", "album_score", "album_personal",
+        "album_mean", "song_album", "song_score", "song_start", "song_end", "genres", "artists", "partials",
+        "_groupings", "_results",
+    )
+
+    def __init__(self, version: int):
+        self.version = version
+        self.album_id = array("q")
+        self.album_year = array("l")
+        self.album_genre = array("H")
+        self.album_artist = array("L")
+        self.album_score = array("d")
+        self.album_personal = array("d")
+        self.album_mean = array("d")
+        # position of each song's album in the album arrays, -1 if it has none
+        self.song_album = array("l")
+        self.song_score = array("d")
+        # per album, its songs are song_score[song_start[i]:song_end[i]]
+        self.song_start = array("l")
+        self.song_end = array("l")
+        self.genres: list[str] = []
+        self.artists: list[str] = []
+        # ALBUM_METRICS and "songs" (song scores) -> Partials per album slot
+        self.partials: dict[str, Partials] = {}
+        self._groupings = {}
+        self._results = {}
+
+def load_columns(bind=read_engine) -> Columns:
+    with bind.connect() as conn:
+        conn.exec_driver_sql("BEGIN")
+        cols = Columns(get_catalog_version(conn))
+        genre_codes, artist_codes, positions = {}, {}, {}
+        albums = conn.execute(
+            select(AlbumDB.id, AlbumDB.year, AlbumDB.genre, AlbumDB.artist, AlbumDB.score, AlbumDB.personal,
+                   AlbumDB.mean)
+            .order_by(AlbumDB.id)
+        )
+        for album_id, year, genre, artist, score, personal, mean in albums:
+            positions[album_id] = len(cols.album_id)
+            cols.album_id.append(album_id)
+            cols.album_year.append(year or 0)
+            cols.album_genre.append(genre_codes.setdefault(genre or "", len(genre_codes)))
+            cols.album_artist.append(artist_codes.setdefault(artist or "", len(artist_codes)))
+            cols.album_score.append(score or 0.0)
+            cols.album_personal.append(personal or 0.0)
+            cols.album_mean.append(mean or 0.0)
+        song_album, song_score = array("l"), array("d")
+        for album_id, score in conn.execute(select(SongDB.album_id, SongDB.score).order_by(SongDB.id)):
+            song_album.append(positions.get(album_id, -1))
+            song_score.append(score or 0.0)
+        conn.rollback()
+    # a table scan and an in-memory sort beat reading through the album_id index
+    order = sorted(range(len(song_album)), key=song_album.__getitem__)
+    cols.song_album = array("l", map(song_album.__getitem__, order))
+    cols.song_score = array("d", map(song_score.__getitem__, order))
+    cols.song_start = array("l", (bisect_left(cols.song_album, p) for p in range(len(cols.album_id))))
+    cols.song_end = array("l", (bisect_right(cols.song_album, p) for p in range(len(cols.album_id))))
+    cols.genres = list(genre_codes)
+    cols.artists = list(artist_codes)
+    cols.partials = {metric: Partials.of_values(getattr(cols, f"album_{metric}")) for metric in ALBUM_METRICS}
+    cols.partials["songs"] = Partials.of_runs(cols.song_score, cols.song_start, cols.song_end)
+    return cols
+
+_columns: Columns | None = None
+_refresh_lock = threading.Lock()
+
+def current_columns(bind=read_engine) -> Columns:
+    """This worker's columns, rebuilt when the catalog version changes (see catalog.current_snapshot)."""
+    global _columns
+    version = current_version(bind)
+    cols = _columns
+    if cols is not None and cols.version >= version:
+        return cols
+    with _refresh_lock:
+        if _columns is None or _columns.version < version:
+            _columns = load_columns(bind)
+        return _columns
+
+def _cached(cols: Columns, key: tuple, compute):
+    found = cols._results.get(key)
+    if found is None:
+        if len(cols._results) >= MAX_CACHED_RESULTS:
+            cols._results.clear()
+        found = cols._results[key] = compute()
+    return found
+
+def _key_column(cols: Columns, field: str) -> array:
+    if field == "genre":
+        return cols.album_genre
+    if field == "year":
+        return cols.album_year
+    if field == "artist":
+        return cols.album_artist
+    return cols.album_id
+
+def _key_code(cols: Columns, field: str, value):
+    """The value a filter on field matches in a grouping key, None if nothing can match."""
+    if field == "genre":
+        return cols.genres.index(value) if value in cols.genres else None
+    if field == "artist":
+        return cols.artists.index(value) if value in cols.artists else None
+    return value
+
+def _runs(cols: Columns, filters: dict, by: str | None = None) -> tuple[Grouping, list[tuple]]:
+    """
+    The grouping sorted by the filtered fields, then by, and its (by value,
+    start, end) runs matching the filters. There are only a handful of field
+    combinations, so each build keeps every grouping it has made.
+    """
+    filters = {field: value for field, value in filters.items() if value is not None}
+    fields = tuple(filters) + ((by,) if by is not None and by not in filters else ())
+    grouping = cols._groupings.get(fields)
+    if grouping is None:
+        grouping = cols._groupings.setdefault(fields, Grouping(cols, fields))
+    wanted = tuple(_key_code(cols, field, value) for field, value in filters.items())
+    if None in wanted:
+        return grouping, []
+    runs = grouping.runs(wanted, fields.index(by) if by is not None else None)
+    if by == "genre":
+        runs = [(cols.genres[code], start, end) for code, start, end in runs]
+    elif by == "artist":
+        runs = [(cols.artists[code], start, end) for code, start, end in runs]
+    return grouping, runs
+
+def _sort_groups(groups: list[dict], sort: str, descending: bool) -> list[dict]:
+    if sort == "key":
+        key = lambda g: g["key"]
+    elif sort == "count":
+        key = lambda g: (g["count"], g["key"])
+    elif sort == "score":
+        key = lambda g: (g["score"]["mean"], g["key"])
+    else:
+        key = lambda g: (g["score"]["stddev"], g["key"])
+    return sorted(groups, key=key, reverse=descending)
+
+def album_groups(cols: Columns, by: str, genre: str | None = None, year: int | None = None,
+                 sort: str = "key", descending: bool = False) -> list[dict]:
+    """count and mean/min/max/stddev of score, personal and mean for each genre, year or artist."""
+    def compute():
+        grouping, runs = _runs(cols, {"genre": genre, "year": year}, by)
+        metrics = {metric: grouping.partials(cols, metric) for metric in ALBUM_METRICS}
+        groups = []
+        for key, start, end in runs:
+            group = {"key": key, "count": end - start}
+            for metric, partials in metrics.items():
+                group[metric] = partials.summary(start, end)[1]
+            groups.append(group)
+        return _sort_groups(groups, sort, descending)
+
+    return _cached(cols, ("album_groups", by, genre, year, sort, descending), compute)
+
+def song_groups(cols: Columns, by: str, genre: str | None = None, year: int | None = None,
+                album_id: int | None = None, sort: str = "key", descending: bool = False) -> list[dict]:
+    """
+    count and score mean/min/max/stddev of songs for each genre, year, artist
+    or album. Grouped by album_id this is the spread of song scores per album.
+    """
+    def compute():
+        grouping, runs = _runs(cols, {"genre": genre, "year": year, "album_id": album_id}, by)
+        songs = grouping.partials(cols, "songs")
+        groups = []
+        for key, start, end in runs:
+            count, score = songs.summary(start, end)
+            if count:
+                groups.append({"key": key, "count": count, "score": score})
+        return _sort_groups(groups, sort, descending)
+
+    return _cached(cols, ("song_groups", by, genre, year, album_id, sort, descending), compute)
+
+def check_bounds(low: float | None, high: float | None) -> None:
+    """Reject histogram bounds that can't make bins: non-finite, or min not below max."""
+    for name, value in (("min", low), ("max", high)):
+        if value is not None and not math.isfinite(value):
+            raise ValueError(f"{name} must be a finite number")
+    if low is not None and high is not None and low >= high:
+        raise ValueError("min must be below max")
+
+def histogram(values, bins: int = DEFAULT_BINS, low: float | None = None, high: float | None = None) -> dict:
+    """Equal-width bins over [low, high]; the last bin includes high and values outside are dropped."""
+    ordered = sorted(values)
+    if low is None:
+        low = ordered[0] if ordered else 0.0
+    if high is None:
+        high = ordered[-1] if ordered else 0.0
+    if high <= low:
+        high = low + 1.0
+    width = (high - low) / bins
+    edges = [low + width * b for b in range(bins)] + [high]
+    # bin b holds edges[b] <= v < edges[b + 1], and the last one also v == high
+    cuts = [bisect_left(ordered, edge) for edge in edges[:-1]] + [bisect_right(ordered, high)]
+    return {
+        "min": low,
+        "max": high,
+        "edges": [round(edge, 6) for edge in edges],
+        "counts": [cuts[b + 1] - cuts[b] for b in range(bins)],
+    }
+
+def album_histogram(cols: Columns, field: str, bins: int = DEFAULT_BINS, low: float | None = None,
+                    high: float | None = None, genre: str | None = None, year: int | None = None) -> dict:
+    check_bounds(low, high)
+
+    def compute():
+        if genre is None and year is None:
+            values = getattr(cols, f"album_{field}")
+        else:
+            grouping, runs = _runs(cols, {"genre": genre, "year": year})
+            column = grouping.partials(cols, field).total
+            values = array("d")
+            for _, start, end in runs:
+                values.extend(column[start:end])
+        return {"field": field, "count": len(values), **histogram(values, bins, low, high)}
+
+    return _cached(cols, ("album_histogram", field, bins, low, high, genre, year), compute)
+
+def song_histogram(cols: Columns, bins: int = DEFAULT_BINS, low: float | None = None, high: float | None = None,
+                   genre: str | None = None, year: int | None = None, album_id: int | None = None) -> dict:
+    check_bounds(low, high)
+
+    def compute():
+        if genre is None and year is None and album_id is None:
+            values = cols.song_score
+        else:
+            grouping, runs = _runs(cols, {"genre": genre, "year": year, "album_id": album_id})
+            values = array("d")
+            for _, start, end in runs:
+                for position in grouping.order[start:end]:
+                    values.extend(cols.song_score[cols.song_start[position]:cols.song_end[position]])
+        return {"field": "score", "count": len(values), **histogram(values, bins, low, high)}
+
+    return _cached(cols, ("song_histogram", bins, low, high, genre, year, album_id), compute)
@@ -0,0 +1,174 @@
+"""
+End-to-end latency benchmark for the API, driven in-process through an ASGI
+transport (no sockets, no server).
+
+    python -m benchmarks.generate --songs 100000 --out bench_data/100k
+    python -m benchmarks.endpoints --data bench_data/100k --output results.json
+    python -m benchmarks.endpoints --data bench_data/100k --baseline results.json
+
+Reports p50/p95/p99 latency, throughput and peak Python heap per endpoint and
+writes everything to --output as JSON. Peak memory is measured with
+tracemalloc, which slows requests down; pass --no-memory for clean latencies.
+Image renders happen in the render worker processes, so their memory is not
+included.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def scenarios(rng: random.Random, albums: int, songs: int, covers: int, genres: list[str]) -> dict:
+    """Endpoint name -> function returning the next URL to request."""
+    album = lambda: rng.randint(1, albums)
+    cover = lambda: rng.randint(1, covers)
+    return {
+        "albums page": lambda: "/albums?limit=100",
+        "albums cards by score": lambda: "/albums?limit=100&sort=-score&include=",
+        "album by id": lambda: f"/album/{album()}",
+        "albums by genre": lambda: f"/albums/genre/{rng.choice(genres)}?include=",
+        "albums by year": lambda: f"/albums/year/{rng.randint(1965, 2025)}",
+        "albums batch": lambda: "/albums/batch?" + "&".join(f"ids={album()}" for _ in range(24)),
+        "songs page": lambda: "/songs?limit=100",
+        "songs by album": lambda: f"/songs/album/{album()}",
+        "song by id": lambda: f"/songs/{rng.randint(1, songs)}",
+        "stats by album": lambda: f"/stats/album/{album()}",
+        "search": lambda: f"/search?q={rng.choice(['love', 'night', 'gold', 'sta', 'mo'])}",
+        "leaderboard": lambda: f"/leaderboard/albums?genre={rng.choice(genres)}&year={rng.randint(1965, 2025)}",
+        "image original": lambda: f"/image/{cover()}.jpg",
+        "image w150": lambda: f"/image/{cover()}.jpg?width=150",
+        "image w300": lambda: f"/image/{cover()}.jpg?width=300",
+        "image w600 webp": lambda: f"/image/{cover()}.jpg?width=600&format=webp",
+    }
+
+async def run_endpoint(client, next_url, requests: int, concurrency: int, measure_memory: bool) -> dict:
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(next_url())
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    if measure_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    peak = None
+    if measure_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "peak_memory_kib": round(peak / 1024, 1) if peak is not None else None,
+    }
+
+async def benchmark(args) -> dict:
+    # configure the app before importing it
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(os.path.join(args.data, 'albums.db'))}"
+    os.environ["IMAGE_STATIC_DIR"] = os.path.join(args.data, "static")
+    os.environ.setdefault("IMAGE_CACHE_DIR", tempfile.mkdtemp(prefix="bench-images-"))
+    if args.snapshot:
+        os.environ["CATALOG_SNAPSHOT"] = "1"
+
+    import httpx
+    import main
+    from models import Genre, AlbumDB, SongDB, read_engine
+    from sqlalchemy import func, select
+
+    with read_engine.connect() as conn:
+        albums = conn.execute(select(func.count()).select_from(AlbumDB)).scalar()
+        songs = conn.execute(select(func.count()).select_from(SongDB)).scalar()
+    covers = len([f for f in os.listdir(os.environ["IMAGE_STATIC_DIR"]) if f.endswith(".jpg")])
+
+    rng = random.Random(args.seed)
+    plan = scenarios(rng, albums, songs, covers, [g.value for g in Genre])
+    wanted = [name for name in plan if not args.only or any(o in name for o in args.only.split(","))]
+
+    results = {}
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in wanted:
+                # warm up caches and lazily built structures before measuring
+                for _ in range(args.warmup):
+                    await client.get(plan[name]())
+                results[name] = await run_endpoint(client, plan[name], args.requests, args.concurrency,
+                                                   not args.no_memory)
+                print(f"{name:26} p50 {results[name]['p50_ms']:8.2f}ms  p95 {results[name]['p95_ms']:8.2f}ms  "
+                      f"p99 {results[name]['p99_ms']:8.2f}ms  {results[name]['throughput_rps']:8.1f} req/s"
+                      + (f"  errors {results[name]['errors']}" if results[name]["errors"] else ""))
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "albums": albums,
+            "songs": songs,
+            "covers": covers,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "snapshot": args.snapshot,
+        },
+        "results": results,
+    }
+
+def compare(current: dict, baseline: dict) -> None:
+    print(f"\n{'endpoint':26} {'p50 before':>11} {'p50 now':>9} {'p95 before':>11} {'p95 now':>9}")
+    for name, now in current["results"].items():
+        before = baseline["results"].get(name)
+        if before:
+            print(f"{name:26} {before['p50_ms']:11.2f} {now['p50_ms']:9.2f} {before['p95_ms']:11.2f} {now['p95_ms']:9.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark API endpoints in-process.")
+    parser.add_argument("--data", default=".", help="directory with albums.db and static/ (see benchmarks.generate)")
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--only", help="comma-separated substrings of endpoint names to run")
+    parser.add_argument("--snapshot", action="store_true", help="serve reads from the in-process catalog snapshot")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc peak memory measurement")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+    sys.exit(0)
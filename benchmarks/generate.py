@@ -0,0 +1,118 @@
+"""
+Build a synthetic catalog for benchmarking: albums.db plus a static/ folder of
+cover images, laid out like the real app so it can be pointed at with
+DATABASE_URL and IMAGE_STATIC_DIR.
+
+    python -m benchmarks.generate --songs 100000 --out bench_data/100k
+
+The same --seed always produces the same catalog.
+"""
+import argparse
+import os
+import random
+import time
+
+from PIL import Image, ImageDraw
+from sqlalchemy import insert
+
+from bootstrap import _batched, compute_ranks
+from catalog import bump_catalog_version
+from models import Base, Genre, AlbumDB, SongDB, create_db_engine
+from search import ensure_search_index
+
+WORDS = (
+    "midnight summer golden blue city love dream fire river heart ghost neon echo wild silver night "
+    "paper stars moon ocean velvet broken electric highway sunset shadow honey diamond thunder glass "
+    "cherry rain garden frozen secret lonely paradise heaven devil angel runaway forever young"
+).split()
+GENRES = [g.value for g in Genre]
+
+def _title(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS).capitalize() for _ in range(words))
+
+def generate_albums(rng: random.Random, count: int, covers: int):
+    artists = [_title(rng, rng.randint(1, 2)) for _ in range(max(1, count // 4))]
+    for album_id in range(1, count + 1):
+        personal = round(min(10.0, max(0.0, rng.gauss(7.8, 1.2))), 1)
+        mean = round(min(10.0, max(0.0, rng.gauss(8.0, 0.8))), 2)
+        yield {
+            "id": album_id,
+            "title": _title(rng, rng.randint(1, 4)),
+            "artist": rng.choice(artists),
+            "image_url": f"/image/{(album_id - 1) % covers + 1}.jpg",
+            "year": rng.randint(1965, 2025),
+            "score": round(min(100.0, max(0.0, rng.gauss(80.0, 9.0))), 2),
+            "personal": personal,
+            "mean": mean,
+            "leng": f"{rng.randint(15, 80)}:{rng.randint(0, 59):02d}",
+            "rec": rng.choice(["Yes", "YESSS", "Some not all", "Ehhh", "no..."]),
+            "review_date": f"{rng.randint(1, 12)}/{rng.randint(1, 28)}/{rng.randint(2022, 2025)}",
+            "genre": rng.choice(GENRES),
+        }
+
+def generate_songs(rng: random.Random, count: int, album_genres: list[str]):
+    for _ in range(count):
+        album_id = rng.randint(1, len(album_genres))
+        yield {
+            "name": _title(rng, rng.randint(1, 3)),
+            "score": round(min(10.0, max(1.0, rng.gauss(7.5, 1.4))), 1),
+            "album_id": album_id,
+            "genre": album_genres[album_id - 1],
+        }
+
+def generate_covers(rng: random.Random, directory: str, count: int, size: int) -> None:
+    os.makedirs(directory, exist_ok=True)
+    for cover in range(1, count + 1):
+        img = Image.new("RGB", (size, size), tuple(rng.randint(0, 255) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        # some shapes so the encoder has real work to do
+        for _ in range(40):
+            x0, y0 = rng.randint(0, size), rng.randint(0, size)
+            x1, y1 = x0 + rng.randint(size // 20, size // 3), y0 + rng.randint(size // 20, size // 3)
+            draw.ellipse((x0, y0, x1, y1), fill=tuple(rng.randint(0, 255) for _ in range(3)))
+        img.save(os.path.join(directory, f"{cover}.jpg"), format="JPEG", quality=90)
+
+def generate(out: str, songs: int, songs_per_album: int = 12, covers: int = 50, cover_size: int = 1400,
+             seed: int = 1) -> dict:
+    rng = random.Random(seed)
+    os.makedirs(out, exist_ok=True)
+    path = os.path.join(out, "albums.db")
+    if os.path.exists(path):
+        os.remove(path)
+    albums = max(1, songs // songs_per_album)
+    covers = min(covers, albums)
+
+    started = time.perf_counter()
+    engine = create_db_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        album_genres = []
+        for batch in _batched(generate_albums(rng, albums, covers)):
+            conn.execute(insert(AlbumDB.__table__), batch)
+            album_genres.extend(a["genre"] for a in batch)
+        for batch in _batched(generate_songs(rng, songs, album_genres)):
+            conn.execute(insert(SongDB.__table__), batch)
+        compute_ranks(conn)
+        # the search index is built in one go here rather than row by row through triggers
+        ensure_search_index(conn)
+        bump_catalog_version(conn)
+        conn.commit()
+    engine.dispose()
+
+    generate_covers(rng, os.path.join(out, "static"), covers, cover_size)
+    return {"albums": albums, "songs": songs, "covers": covers, "seconds": round(time.perf_counter() - started, 2)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic catalog for benchmarks.")
+    parser.add_argument("--out", required=True, help="directory to write albums.db and static/ into")
+    parser.add_argument("--songs", type=int, default=10000, help="number of songs (1k to 1M)")
+    parser.add_argument("--songs-per-album", type=int, default=12)
+    parser.add_argument("--covers", type=int, default=50, help="distinct cover images, reused round-robin")
+    parser.add_argument("--cover-size", type=int, default=1400, help="cover edge length in pixels")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    summary = generate(args.out, args.songs, args.songs_per_album, args.covers, args.cover_size, args.seed)
+    print(f"Generated {summary['albums']} albums, {summary['songs']} songs and {summary['covers']} covers "
+          f"in {args.out} ({summary['seconds']}s)")
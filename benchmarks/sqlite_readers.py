@@ -0,0 +1,111 @@
+"""
+Reader throughput while a writer keeps committing, default SQLite settings vs
+the tuned settings in models.SQLITE_PRAGMAS.
+
+    python -m benchmarks.sqlite_readers --readers 4 --seconds 5
+
+Each reader is a separate process (like a gunicorn worker) running point and
+list queries through its own read-only engine; one writer process updates
+album scores and inserts/deletes songs in small transactions. Every mode runs
+against a fresh copy of albums.db.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from models import SQLITE_PRAGMAS, create_db_engine
+
+MODES = {
+    # what SQLite does out of the box
+    "default": {"journal_mode": "DELETE", "synchronous": "FULL", "busy_timeout": 5000},
+    "tuned": SQLITE_PRAGMAS,
+}
+
+def _reader(url: str, pragmas: dict, seconds: float, results):
+    engine = create_db_engine(url, read_only=True, pragmas=pragmas, pool_size=1)
+    reads = errors = 0
+    deadline = time.monotonic() + seconds
+    with engine.connect() as conn:
+        max_id = conn.execute(text("SELECT max(id) FROM albums")).scalar()
+        while time.monotonic() < deadline:
+            album_id = random.randint(1, max_id)
+            try:
+                conn.execute(text("SELECT * FROM albums WHERE id = :id"), {"id": album_id}).all()
+                conn.execute(text("SELECT * FROM songs WHERE album_id = :id"), {"id": album_id}).all()
+                conn.rollback()
+                reads += 1
+            except Exception:
+                conn.rollback()
+                errors += 1
+    results.put(("reader", reads, errors))
+
+def _writer(url: str, pragmas: dict, seconds: float, results):
+    engine = create_db_engine(url, pragmas=pragmas, pool_size=1)
+    writes = errors = 0
+    deadline = time.monotonic() + seconds
+    with engine.connect() as conn:
+        max_id = conn.execute(text("SELECT max(id) FROM albums")).scalar()
+        conn.rollback()
+        while time.monotonic() < deadline:
+            album_id = random.randint(1, max_id)
+            try:
+                conn.execute(text("UPDATE albums SET score = score WHERE id = :id"), {"id": album_id})
+                song_id = conn.execute(
+                    text("INSERT INTO songs (name, score, album_id, genre) VALUES ('bench', 5.0, :id, '') RETURNING id"),
+                    {"id": album_id},
+                ).scalar()
+                conn.execute(text("DELETE FROM songs WHERE id = :id"), {"id": song_id})
+                conn.commit()
+                writes += 1
+            except Exception:
+                conn.rollback()
+                errors += 1
+    results.put(("writer", writes, errors))
+
+def run(mode: str, source: str, readers: int, seconds: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "albums.db")
+        shutil.copy(source, path)
+        url = f"sqlite:///{path}"
+        pragmas = MODES[mode]
+        # set the journal mode once, before anyone starts reading
+        with create_db_engine(url, pragmas=pragmas, pool_size=1).connect():
+            pass
+
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=_reader, args=(url, pragmas, seconds, results)) for _ in range(readers)]
+        procs.append(multiprocessing.Process(target=_writer, args=(url, pragmas, seconds, results)))
+        for p in procs:
+            p.start()
+        outcome = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+
+    reads = sum(n for kind, n, _ in outcome if kind == "reader")
+    return {
+        "mode": mode,
+        "readers": readers,
+        "seconds": seconds,
+        "reads_per_sec": round(reads / seconds, 1),
+        "writes_per_sec": round(sum(n for kind, n, _ in outcome if kind == "writer") / seconds, 1),
+        "reader_errors": sum(e for kind, _, e in outcome if kind == "reader"),
+        "writer_errors": sum(e for kind, _, e in outcome if kind == "writer"),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default="albums.db", help="database to copy for each run")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--modes", default=",".join(MODES))
+    args = parser.parse_args()
+
+    for mode in args.modes.split(","):
+        print(json.dumps(run(mode, args.db, args.readers, args.seconds)))
@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import NamedTuple
+
+from sqlalchemy import select, update, insert
+
+from models import read_engine, AlbumDB, SongDB, StatsDB, CatalogVersionDB
+from pagination import review_date_key
+
+SNAPSHOT_ENABLED = os.environ.get("CATALOG_SNAPSHOT", "") not in ("", "0", "false")
+# how often a worker checks the version stamp, in seconds
+SNAPSHOT_CHECK_INTERVAL = float(os.environ.get("CATALOG_SNAPSHOT_CHECK_INTERVAL", 1.0))
+
+def get_catalog_version(conn) -> int:
+    return conn.execute(select(CatalogVersionDB.version).where(CatalogVersionDB.id == 1)).scalar() or 0
+
+def bump_catalog_version(conn) -> None:
+    """Mark the catalog as changed. Call inside the transaction that changes it."""
+    bumped = conn.execute(
+        update(CatalogVersionDB.__table__).where(CatalogVersionDB.id == 1).values(version=CatalogVersionDB.version + 1)
+    )
+    if bumped.rowcount == 0:
+        conn.execute(insert(CatalogVersionDB.__table__).values(id=1, version=1))
+
+class StatsRecord(NamedTuple):
+    album_rank: int
+    highest_song_rank: int
+    rank_in_year: int
+    rank_in_genre: int
+
+class SongRecord(NamedTuple):
+    id: int
+    name: str
+    score: float
+    album_id: int
+    song_rank: int
+    genre: str
+
+class AlbumRecord(NamedTuple):
+    id: int
+    title: str
+    artist: str
+    image_url: str
+    year: int
+    score: float
+    personal: float
+    mean: float
+    leng: str
+    rec: str
+    review_date: str
+    genre: str
+    stats: tuple[StatsRecord, ...]
+    songs: tuple[SongRecord, ...]
+
+class Snapshot:
+    """
+    Immutable, fully indexed copy of the catalog.
+
+    Records are tuples with the same attribute names as the ORM models, so they
+    serialise through the existing response models unchanged.
+    """
+
+    __slots__ = (
+        "version", "albums", "songs", "albums_by_id", "albums_by_genre", "albums_by_year",
+        "songs_by_id", "songs_by_album", "stats_by_album", "_orders",
+    )
+
+    def __init__(self, version: int, albums: tuple[AlbumRecord, ...], songs: tuple[SongRecord, ...],
+                 stats_by_album: dict[int, tuple[StatsRecord, ...]]):
+        self.version = version
+        self.albums = albums
+        self.songs = songs
+        self.stats_by_album = stats_by_album
+        self.albums_by_id = {a.id: a for a in albums}
+        self.songs_by_id = {s.id: s for s in songs}
+
+        by_genre, by_year, by_album = defaultdict(list), defaultdict(list), defaultdict(list)
+        for a in albums:
+            by_genre[a.genre].append(a)
+            by_year[a.year].append(a)
+        for s in songs:
+            by_album[s.album_id].append(s)
+        self.albums_by_genre = {k: tuple(v) for k, v in by_genre.items()}
+        self.albums_by_year = {k: tuple(v) for k, v in by_year.items()}
+        self.songs_by_album = {k: tuple(v) for k, v in by_album.items()}
+        self._orders = {}
+
+    def sorted_by(self, collection: str, field: str) -> tuple[tuple, list]:
+        """
+        Records of "albums" or "songs" sorted ascending by (field, id), with the
+        matching key list for bisecting. Built on first use and kept for the
+        lifetime of the snapshot.
+        """
+        order = self._orders.get((collection, field))
+        if order is None:
+            key = (lambda r: (review_date_key(r.review_date), r.id)) if field == "review_date" else \
+                (lambda r: (getattr(r, field), r.id))
+            records = tuple(sorted(getattr(self, collection), key=key))
+            order = self._orders[(collection, field)] = (records, [key(r) for r in records])
+        return order
+
+    def albums_by_artist(self, artist: str) -> list[AlbumRecord]:
+        needle = artist.lower()
+        return [a for a in self.albums if needle in a.artist.lower()]
+
+def load_snapshot(bind=read_engine) -> Snapshot:
+    # one consistent read of all three tables
+    with bind.connect() as conn:
+        conn.exec_driver_sql("BEGIN")
+        version = get_catalog_version(conn)
+        song_rows = conn.execute(
+            select(SongDB.id, SongDB.name, SongDB.score, SongDB.album_id, SongDB.song_rank, SongDB.genre)
+            .order_by(SongDB.id)
+        ).all()
+        stats_rows = conn.execute(
+            select(StatsDB.album_id, StatsDB.album_rank, StatsDB.highest_song_rank,
+                   StatsDB.rank_in_year, StatsDB.rank_in_genre)
+            .order_by(StatsDB.id)
+        ).all()
+        album_rows = conn.execute(
+            select(AlbumDB.id, AlbumDB.title, AlbumDB.artist, AlbumDB.image_url, AlbumDB.year, AlbumDB.score,
+                   AlbumDB.personal, AlbumDB.mean, AlbumDB.leng, AlbumDB.rec, AlbumDB.review_date, AlbumDB.genre)
+            .order_by(AlbumDB.id)
+        ).all()
+        conn.rollback()
+
+    songs = tuple(SongRecord(*row) for row in song_rows)
+    songs_by_album = defaultdict(list)
+    for s in songs:
+        songs_by_album[s.album_id].append(s)
+    stats_by_album = defaultdict(list)
+    for album_id, *ranks in stats_rows:
+        stats_by_album[album_id].append(StatsRecord(*ranks))
+    stats_by_album = {k: tuple(v) for k, v in stats_by_album.items()}
+
+    albums = tuple(
+        AlbumRecord(*row, stats_by_album.get(row.id, ()), tuple(songs_by_album.get(row.id, ())))
+        for row in album_rows
+    )
+    return Snapshot(version, albums, songs, stats_by_album)
+
+_version: int | None = None
+_checked_at = 0.0
+_version_lock = threading.Lock()
+
+def cached_version() -> int | None:
+    """The last polled catalog version, or None if it is due to be checked again."""
+    if _version is not None and time.monotonic() - _checked_at < SNAPSHOT_CHECK_INTERVAL:
+        return _version
+    return None
+
+def current_version(bind=read_engine) -> int:
+    """This worker's view of the catalog version, polled at most every SNAPSHOT_CHECK_INTERVAL seconds."""
+    global _version, _checked_at
+    version = cached_version()
+    if version is not None:
+        return version
+    with _version_lock:
+        version = cached_version()
+        if version is None:
+            with bind.connect() as conn:
+                version = _version = get_catalog_version(conn)
+            _checked_at = time.monotonic()
+    return version
+
+def expire_version() -> None:
+    """Force the next lookup to re-read the version stamp, e.g. right after this worker wrote to the catalog."""
+    global _checked_at
+    _checked_at = 0.0
+
+_snapshot: Snapshot | None = None
+_refresh_lock = threading.Lock()
+
+def current_snapshot(bind=read_engine) -> Snapshot:
+    """
+    Return this worker's snapshot, rebuilding it when the catalog version changes.
+
+    A new snapshot replaces the old one in a single assignment, so readers
+    always see one complete version.
+    """
+    global _snapshot
+    version = current_version(bind)
+    snapshot = _snapshot
+    # a snapshot may be a little newer than the polled stamp, never older
+    if snapshot is not None and snapshot.version >= version:
+        return snapshot
+
+    with _refresh_lock:
+        if _snapshot is None or _snapshot.version < version:
+            _snapshot = load_snapshot(bind)
+        return _snapshot
+
+def get_snapshot() -> Snapshot | None:
+    """FastAPI dependency: the current snapshot in read-model mode, otherwise None."""
+    if not SNAPSHOT_ENABLED:
+        return None
+    return current_snapshot()
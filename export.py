@@ -0,0 +1,118 @@
+"""
+Stream whole tables as NDJSON or CSV for clients that mirror the catalog.
+
+Rows come off one read transaction EXPORT_CHUNK_ROWS at a time and are
+encoded (and optionally gzipped) chunk by chunk, so memory stays flat and the
+first bytes go out before the last rows are read. The columns match what
+importer.py reads back.
+"""
+import csv
+import io
+import json
+import os
+import zlib
+
+import anyio
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+
+from models import read_engine, AlbumDB, SongDB
+
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", 1000))
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+ALBUM_COLUMNS = (AlbumDB.id, AlbumDB.title, AlbumDB.artist, AlbumDB.image_url, AlbumDB.year, AlbumDB.score,
+                 AlbumDB.personal, AlbumDB.mean, AlbumDB.leng, AlbumDB.rec, AlbumDB.review_date, AlbumDB.genre)
+SONG_COLUMNS = (SongDB.id, SongDB.name, SongDB.score, SongDB.album_id, SongDB.genre, SongDB.song_rank)
+
+def album_query(genre: str | None = None, year: int | None = None):
+    query = select(*ALBUM_COLUMNS).order_by(AlbumDB.id)
+    if genre is not None:
+        query = query.where(AlbumDB.genre == genre)
+    if year is not None:
+        query = query.where(AlbumDB.year == year)
+    return query
+
+def song_query(genre: str | None = None, year: int | None = None, album_id: int | None = None):
+    query = select(*SONG_COLUMNS).order_by(SongDB.id)
+    if genre is not None:
+        query = query.where(SongDB.genre == genre)
+    if year is not None:
+        query = query.where(SongDB.album_id.in_(select(AlbumDB.id).where(AlbumDB.year == year)))
+    if album_id is not None:
+        query = query.where(SongDB.album_id == album_id)
+    return query
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.partition(";")
+        if coding.strip().lower() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+def _encode_ndjson(names: list[str], rows) -> bytes:
+    return "".join(json.dumps(dict(zip(names, row))) + "\n" for row in rows).encode()
+
+def _encode_csv(names: list[str], rows) -> bytes:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(rows)
+    return buf.getvalue().encode()
+
+def stream(query, fmt: str = "ndjson", compress: bool = False, bind=read_engine, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """
+    Yield the encoded rows of query in chunks, inside one consistent read.
+
+    Close the generator if you stop early; that ends the read transaction.
+    """
+    names = [c.name for c in query.selected_columns]
+    encode = _encode_csv if fmt == "csv" else _encode_ndjson
+    # gzip stream, flushed after every chunk so the client can decode as it goes
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def out(data: bytes) -> bytes:
+        return gzip.compress(data) + gzip.flush(zlib.Z_SYNC_FLUSH) if gzip else data
+
+    if fmt == "csv":
+        yield out(_encode_csv(names, [names]))
+    conn = bind.connect()
+    try:
+        conn.exec_driver_sql("BEGIN")
+        result = conn.execution_options(yield_per=chunk_rows).execute(query)
+        for rows in result.partitions():
+            yield out(encode(names, rows))
+    finally:
+        # also reached through close() when the response stops early, so an
+        # abandoned export doesn't keep its read transaction and connection
+        conn.rollback()
+        conn.close()
+    if gzip:
+        yield gzip.flush()
+
+async def _iterate(chunks):
+    try:
+        while (chunk := await run_in_threadpool(next, chunks, None)) is not None:
+            yield chunk
+    finally:
+        await run_in_threadpool(chunks.close)
+
+class ExportResponse(StreamingResponse):
+    """
+    Streams a stream() from the threadpool and always closes it when the
+    response ends, finished or not. A client that disconnects half way shows up
+    as a failed send or a cancellation, and either way leaves starlette's loop
+    over the body without closing it.
+    """
+
+    def __init__(self, chunks, **kwargs):
+        super().__init__(_iterate(chunks), **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self.body_iterator.aclose()
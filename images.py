@@ -0,0 +1,461 @@
+import argparse
+import hashlib
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps, features
+
+import metrics
+
+STATIC_DIR = os.environ.get("IMAGE_STATIC_DIR", "static")
+CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", os.path.join(".cache", "images"))
+MEMORY_CACHE_BYTES = int(os.environ.get("IMAGE_MEMORY_CACHE_BYTES", 64 * 1024 * 1024))
+# renditions and sprites on disk; the least recently used go once CACHE_DIR outgrows this
+DISK_CACHE_BYTES = int(os.environ.get("IMAGE_DISK_CACHE_BYTES", 1024 * 1024 * 1024))
+CACHE_CONTROL = "public, max-age=86400"
+# sprite URLs are content-addressed, so they never change
+SPRITE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+RENDER_WORKERS = int(os.environ.get("IMAGE_RENDER_WORKERS", 2))
+MAX_PENDING_RENDERS = int(os.environ.get("IMAGE_MAX_PENDING_RENDERS", 32))
+MAX_OUTPUT_PIXELS = int(os.environ.get("IMAGE_MAX_OUTPUT_PIXELS", 4096 * 4096))
+PRERENDER_WIDTHS = [int(w) for w in os.environ.get("IMAGE_PRERENDER_WIDTHS", "150,300,600").split(",") if w]
+DEFAULT_QUALITY = 85
+# files under STATIC_DIR that are covers; anything else there is left alone
+SOURCE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".avif", ".gif"}
+SPRITE_TILE_SIZE = 150
+SPRITE_MAX_TILE_SIZE = 600
+SPRITE_MAX_TILES = int(os.environ.get("IMAGE_SPRITE_MAX_TILES", 100))
+
+# format name -> (Pillow encoder, media type, file extension)
+FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "webp": ("WEBP", "image/webp", "webp"),
+    "avif": ("AVIF", "image/avif", "avif"),
+}
+SUPPORTED_FORMATS = [fmt for fmt in FORMATS if fmt == "jpeg" or features.check(fmt)]
+# preferred order when the client accepts several
+NEGOTIATION_ORDER = [fmt for fmt in ("avif", "webp") if fmt in SUPPORTED_FORMATS]
+
+class ImageTooLarge(Exception):
+    pass
+
+class RenderQueueFull(Exception):
+    pass
+
+class RenditionCache:
+    """Thread-safe LRU of encoded renditions, bounded by total size in bytes."""
+
+    def __init__(self, max_bytes: int = MEMORY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+memory_cache = RenditionCache()
+
+def resolve_source(image_name: str) -> str:
+    """Map an image name to a file under STATIC_DIR, rejecting directory traversal."""
+    image_path = os.path.join(STATIC_DIR, image_name)
+    if not os.path.abspath(image_path).startswith(os.path.abspath(STATIC_DIR) + os.sep):
+        raise ValueError("Invalid image path")
+    if not os.path.isfile(image_path):
+        raise FileNotFoundError(image_name)
+    return image_path
+
+def negotiate_format(accept: str | None) -> str:
+    """Pick the best output format the client lists in its Accept header, falling back to JPEG."""
+    accepted = set()
+    for media_range in (accept or "").split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    pass
+        if weight > 0:
+            accepted.add(media_type.lower())
+    for fmt in NEGOTIATION_ORDER:
+        if FORMATS[fmt][1] in accepted:
+            return fmt
+    return "jpeg"
+
+def rendition_key(image_path: str, width: int | None, height: int | None, quality: int,
+                  fmt: str = "jpeg", progressive: bool = False) -> str:
+    """
+    Identify a rendition by its source file version and transform parameters.
+
+    The key doubles as a strong ETag: the same source and parameters always
+    produce the same bytes, so a client holding it can be answered with a 304.
+    """
+    st = os.stat(image_path)
+    raw = f"{os.path.basename(image_path)}:{st.st_mtime_ns}:{st.st_size}:{width}:{height}:{quality}:{fmt}:{progressive}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+def source_format(image_path: str) -> str | None:
+    """The output format name matching the source file's extension, if it is one we produce."""
+    extension = os.path.splitext(image_path)[1].lower().lstrip(".")
+    extension = "jpg" if extension == "jpeg" else extension
+    return next((fmt for fmt, (_, _, ext) in FORMATS.items() if ext == extension), None)
+
+def source_key(image_path: str) -> str:
+    """Identify the source file version; the strong ETag of an untransformed original."""
+    st = os.stat(image_path)
+    raw = f"{os.path.basename(image_path)}:{st.st_mtime_ns}:{st.st_size}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+def locate(image_name: str, *transform) -> tuple[str, str]:
+    """
+    resolve_source() plus the ETag key of what will be served: source_key()
+    for the untransformed original, rendition_key(path, *transform) otherwise.
+    Both stat the file, so callers on the event loop run this in a thread.
+    """
+    image_path = resolve_source(image_name)
+    return image_path, rendition_key(image_path, *transform) if transform else source_key(image_path)
+
+def sprite_layout(count: int, columns: int | None = None) -> tuple[int, int]:
+    """(columns, rows) of a sprite grid, as square as possible unless columns is given."""
+    columns = max(1, min(count, columns or math.ceil(math.sqrt(count))))
+    return columns, math.ceil(count / columns)
+
+def sprite_key(image_paths: list[str], tile: int, columns: int, quality: int, fmt: str = "jpeg") -> str:
+    """Like rendition_key, over every source of the sprite and the grid parameters."""
+    parts = ["sprite", str(tile), str(columns), str(quality), fmt]
+    for image_path in image_paths:
+        st = os.stat(image_path)
+        parts.append(f"{os.path.basename(image_path)}:{st.st_mtime_ns}:{st.st_size}")
+    return hashlib.sha256(":".join(parts).encode()).hexdigest()[:32]
+
+def transform(image_path: str, width: int | None, height: int | None, quality: int,
+              fmt: str = "jpeg", progressive: bool = False, timings: dict | None = None) -> bytes:
+    """Render one variant. Seconds spent decoding, resizing and encoding go into timings if given."""
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+    with Image.open(image_path) as img:
+        img.load()
+        decoded = time.perf_counter()
+        timings["decode"] = decoded - started
+        # Resize if width or height specified
+        if width is not None and height is not None:
+            img = img.resize((width, height), Image.Resampling.LANCZOS)
+        elif width is not None:
+            ratio = img.height / img.width
+            img = img.resize((width, int(width * ratio)), Image.Resampling.LANCZOS)
+        elif height is not None:
+            ratio = img.width / img.height
+            img = img.resize((int(height * ratio), height), Image.Resampling.LANCZOS)
+        resized = time.perf_counter()
+        timings["resize"] = resized - decoded
+
+        options = {"quality": quality}
+        if fmt == "jpeg":
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            if progressive:
+                options.update(progressive=True, optimize=True)
+
+        img_io = BytesIO()
+        img.save(img_io, format=FORMATS[fmt][0], **options)
+        timings["encode"] = time.perf_counter() - resized
+        return img_io.getvalue()
+
+def _disk_path(key: str, fmt: str = "jpeg") -> str:
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.{FORMATS[fmt][2]}")
+
+def output_size(image_path: str, width: int | None, height: int | None) -> tuple[int, int]:
+    """Work out the rendered dimensions from the image header alone, without decoding pixels."""
+    if (width is not None and width <= 0) or (height is not None and height <= 0):
+        raise ValueError("width and height must be positive")
+    with Image.open(image_path) as img:
+        src_width, src_height = img.size
+    if width is not None and height is not None:
+        return width, height
+    if width is not None:
+        return width, int(width * src_height / src_width)
+    if height is not None:
+        return int(height * src_width / src_height), height
+    return src_width, src_height
+
+def check_admission(image_path: str, width: int | None, height: int | None) -> None:
+    out_width, out_height = output_size(image_path, width, height)
+    if out_width * out_height > MAX_OUTPUT_PIXELS:
+        raise ImageTooLarge(f"Requested image exceeds {MAX_OUTPUT_PIXELS} pixels")
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write then rename so concurrent readers never see a partial file
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _render_to_disk(image_path: str, path: str, width: int | None, height: int | None, quality: int,
+                    fmt: str = "jpeg", progressive: bool = False) -> tuple[bytes, dict]:
+    # Runs in a render worker process
+    timings = {}
+    data = transform(image_path, width, height, quality, fmt, progressive, timings)
+    started = time.perf_counter()
+    _write_atomic(path, data)
+    timings["write"] = time.perf_counter() - started
+    return data, timings
+
+def sprite_name(key: str, fmt: str = "jpeg") -> str:
+    return f"{key}.{FORMATS[fmt][2]}"
+
+def sprite_file(name: str) -> tuple[str, str] | None:
+    """(path, media type) of a rendered sprite named like sprite_name(), or None if there is none."""
+    key, _, extension = name.partition(".")
+    fmt = next((f for f, (_, _, ext) in FORMATS.items() if ext == extension), None)
+    if fmt is None or len(key) != 32 or any(c not in "0123456789abcdef" for c in key):
+        return None
+    path = _disk_path(key, fmt)
+    return (path, FORMATS[fmt][1]) if os.path.isfile(path) else None
+
+def compose_sprite(image_paths: list[str], tile: int, columns: int, quality: int, fmt: str = "jpeg",
+                   timings: dict | None = None) -> bytes:
+    """Center-crop every source to a tile x tile thumbnail and lay them out left to right, top to bottom."""
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+    columns, rows = sprite_layout(len(image_paths), columns)
+    sprite = Image.new("RGB", (columns * tile, rows * tile), "white")
+    decode = resize = 0.0
+    for i, image_path in enumerate(image_paths):
+        with Image.open(image_path) as img:
+            # let JPEG decode at a reduced scale when the tile is much smaller than the cover
+            img.draft("RGB", (tile, tile))
+            img = img.convert("RGB")
+            decoded = time.perf_counter()
+            thumb = ImageOps.fit(img, (tile, tile), Image.Resampling.LANCZOS)
+            sprite.paste(thumb, ((i % columns) * tile, (i // columns) * tile))
+            resized = time.perf_counter()
+        decode += decoded - started
+        resize += resized - decoded
+        started = resized
+    timings["decode"], timings["resize"] = decode, resize
+
+    img_io = BytesIO()
+    sprite.save(img_io, format=FORMATS[fmt][0], quality=quality)
+    timings["encode"] = time.perf_counter() - started
+    return img_io.getvalue()
+
+def _render_sprite_to_disk(image_paths: list[str], path: str, tile: int, columns: int, quality: int,
+                           fmt: str = "jpeg") -> tuple[bytes, dict]:
+    # Runs in a render worker process
+    timings = {}
+    data = compose_sprite(image_paths, tile, columns, quality, fmt, timings)
+    started = time.perf_counter()
+    _write_atomic(path, data)
+    timings["write"] = time.perf_counter() - started
+    return data, timings
+
+def cached_rendition(key: str, fmt: str = "jpeg") -> bytes | None:
+    """Look a rendition up in memory, then on disk. Returns None on a miss."""
+    data = memory_cache.get(key)
+    if data is not None:
+        return data
+    path = _disk_path(key, fmt)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        # mtime doubles as last use, so trim_disk_cache keeps renditions still being read
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    memory_cache.put(key, data)
+    return data
+
+def trim_disk_cache(max_bytes: int = DISK_CACHE_BYTES) -> int:
+    """
+    Delete the least recently used files in CACHE_DIR, oldest mtime first,
+    until it is back under 90% of max_bytes. Returns the bytes freed.
+    """
+    files, total = [], 0
+    for root, _, names in os.walk(CACHE_DIR):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime_ns, st.st_size, path))
+            total += st.st_size
+    if total <= max_bytes:
+        return 0
+    files.sort()
+    freed = 0
+    for _, size, path in files:
+        if total - freed <= max_bytes * 0.9:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        freed += size
+    return freed
+
+_written_since_trim = 0
+_trim_lock = threading.Lock()
+_trimming = False
+
+def _note_written(size: int) -> None:
+    """Trim the disk cache from a background thread after every DISK_CACHE_BYTES / 16 written."""
+    global _written_since_trim, _trimming
+    with _trim_lock:
+        _written_since_trim += size
+        if _trimming or _written_since_trim < DISK_CACHE_BYTES // 16:
+            return
+        _written_since_trim, _trimming = 0, True
+
+    def run():
+        global _trimming
+        try:
+            trim_disk_cache()
+        finally:
+            _trimming = False
+
+    threading.Thread(target=run, name="image-cache-trim", daemon=True).start()
+
+_executor: ProcessPoolExecutor | None = None
+_inflight: dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+def _finish(key: str, future: Future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        data, timings = future.result()
+        memory_cache.put(key, data)
+        metrics.record_image_stages(timings)
+        _note_written(len(data))
+    with _inflight_lock:
+        _inflight.pop(key, None)
+
+def submit_rendition(image_path: str, key: str, width: int | None, height: int | None, quality: int,
+                     fmt: str = "jpeg", progressive: bool = False) -> Future:
+    """
+    Render a variant in the worker pool. The future resolves to the encoded
+    bytes and the seconds spent in each render stage.
+
+    Concurrent requests for the same key share one future, and new work is
+    refused with RenderQueueFull once MAX_PENDING_RENDERS renders are in flight.
+    """
+    return _submit(key, _render_to_disk, image_path, _disk_path(key, fmt), width, height, quality, fmt, progressive)
+
+def submit_sprite(image_paths: list[str], key: str, tile: int, columns: int, quality: int,
+                  fmt: str = "jpeg") -> Future:
+    """Compose a sprite in the worker pool, with the same single-flight and limits as submit_rendition."""
+    return _submit(key, _render_sprite_to_disk, image_paths, _disk_path(key, fmt), tile, columns, quality, fmt)
+
+def _submit(key: str, render, *args) -> Future:
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future
+        if len(_inflight) >= MAX_PENDING_RENDERS:
+            raise RenderQueueFull("Too many images being rendered, try again shortly")
+        future = _get_executor().submit(render, *args)
+        _inflight[key] = future
+    future.add_done_callback(lambda f: _finish(key, f))
+    return future
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def _prerender_jobs(widths: list[int], formats: list[str]):
+    """Yield (image_path, key, width, fmt) for every standard rendition not yet on disk."""
+    for image_name in sorted(os.listdir(STATIC_DIR)):
+        image_path = os.path.join(STATIC_DIR, image_name)
+        if os.path.splitext(image_name)[1].lower() not in SOURCE_EXTENSIONS or not os.path.isfile(image_path):
+            continue
+        for width in widths:
+            for fmt in formats:
+                key = rendition_key(image_path, width, None, DEFAULT_QUALITY, fmt)
+                if not os.path.exists(_disk_path(key, fmt)):
+                    yield image_path, key, width, fmt
+
+def prerender(widths: list[int] = PRERENDER_WIDTHS, formats: list[str] = SUPPORTED_FORMATS,
+              workers: int | None = None) -> int:
+    """Render the standard widths of every cover in parallel, using all cores by default."""
+    jobs = list(_prerender_jobs(widths, formats))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [
+            pool.submit(_render_to_disk, image_path, _disk_path(key, fmt), width, None, DEFAULT_QUALITY, fmt)
+            for image_path, key, width, fmt in jobs
+        ]
+        for future in futures:
+            future.result()
+    trim_disk_cache()
+    return len(jobs)
+
+def prerender_in_background(widths: list[int] = PRERENDER_WIDTHS, formats: list[str] = SUPPORTED_FORMATS) -> threading.Thread:
+    """
+    Fill the rendition cache from a background thread while the app serves requests.
+
+    Jobs go through submit_rendition one at a time, so they share single-flight
+    with live requests and never hold more than one slot of the render pool.
+    """
+    def run():
+        for image_path, key, width, fmt in _prerender_jobs(widths, formats):
+            try:
+                submit_rendition(image_path, key, width, None, DEFAULT_QUALITY, fmt).result()
+            except RenderQueueFull:
+                continue
+            except RuntimeError:
+                # pool shut down while we were still going
+                return
+
+    thread = threading.Thread(target=run, name="image-prerender", daemon=True)
+    thread.start()
+    return thread
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render standard cover widths into the image cache.")
+    parser.add_argument("--widths", default=",".join(map(str, PRERENDER_WIDTHS)), help="comma-separated widths in pixels")
+    parser.add_argument("--formats", default=",".join(SUPPORTED_FORMATS), help="comma-separated output formats")
+    parser.add_argument("--workers", type=int, default=None, help="render processes (default: CPU count)")
+    args = parser.parse_args()
+
+    widths = [int(w) for w in args.widths.split(",") if w]
+    formats = [f for f in args.formats.split(",") if f in SUPPORTED_FORMATS]
+    count = prerender(widths, formats, args.workers)
+    print(f"Rendered {count} images into {CACHE_DIR}")
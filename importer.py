@@ -0,0 +1,284 @@
+"""
+Bulk import albums and songs from CSV or NDJSON files.
+
+    python importer.py --albums albums.ndjson --songs songs.csv
+
+Files are streamed in fixed-size chunks, so memory stays flat however large
+the catalog is. Each chunk is validated, upserted with executemany and
+committed in its own transaction; ranks are recomputed and the catalog
+version bumped once at the end. A file whose checksum matches the last
+import from the same path is skipped unless --force is given.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import math
+import os
+import time
+from collections import defaultdict
+
+from sqlalchemy import select, insert, update, func, or_, tuple_
+from sqlalchemy.dialects.sqlite import insert as upsert
+
+from bootstrap import _batched, compute_ranks
+from catalog import bump_catalog_version
+from models import engine, Base, Genre, AlbumDB, SongDB, ImportDB
+
+CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", 5000))
+MAX_REPORTED_ERRORS = 20
+
+GENRES = {g.value for g in Genre}
+
+def _genre(value) -> str:
+    value = str(value).strip()
+    if value not in GENRES:
+        raise ValueError(f"unknown genre {value!r}")
+    return value
+
+def _finite(value) -> float:
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError("must be a finite number")
+    return value
+
+def _id(value) -> int:
+    value = int(value)
+    if value <= 0:
+        raise ValueError("must be a positive integer")
+    return value
+
+REQUIRED = object()
+
+# field -> (converter, default used when the field is missing or empty)
+ALBUM_FIELDS = {
+    "id": (_id, REQUIRED),
+    "title": (str, REQUIRED),
+    "artist": (str, REQUIRED),
+    "image_url": (str, ""),
+    "year": (int, REQUIRED),
+    "score": (_finite, REQUIRED),
+    "personal": (_finite, 0.0),
+    "mean": (_finite, 0.0),
+    "leng": (str, "0"),
+    "rec": (str, ""),
+    "review_date": (str, ""),
+    "genre": (_genre, REQUIRED),
+}
+SONG_FIELDS = {
+    # songs.csv has no ids; those rows are matched on (album_id, name)
+    "id": (_id, None),
+    "name": (str, REQUIRED),
+    "score": (_finite, REQUIRED),
+    "album_id": (_id, REQUIRED),
+}
+KINDS = {"albums": ALBUM_FIELDS, "songs": SONG_FIELDS}
+
+def validate(row: dict, fields: dict) -> dict:
+    """Convert one raw row to column values, raising ValueError on the first bad field."""
+    clean = {}
+    for field, (convert, default) in fields.items():
+        value = row.get(field)
+        if value is None or value == "":
+            if default is REQUIRED:
+                raise ValueError(f"missing {field}")
+            clean[field] = default
+            continue
+        try:
+            clean[field] = convert(value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"bad {field} {value!r}: {e}") from None
+    return clean
+
+def read_rows(path: str, fmt: str | None = None):
+    """Yield (line number, row dict or parse error) from a CSV or NDJSON file."""
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "ndjson")
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_num, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_num, ValueError(f"invalid JSON: {e}")
+                continue
+            yield line_num, row if isinstance(row, dict) else ValueError("expected a JSON object")
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _upsert(table, names, key: str = "id"):
+    """INSERT ... ON CONFLICT DO UPDATE of the named columns that leaves identical rows untouched."""
+    stmt = upsert(table)
+    columns = [table.c[name] for name in names if name != key]
+    return stmt.on_conflict_do_update(
+        index_elements=[key],
+        set_={c.name: stmt.excluded[c.name] for c in columns},
+        # skipping no-op updates keeps re-imports from rewriting pages and search index rows
+        where=or_(*(c.is_distinct_from(stmt.excluded[c.name]) for c in columns)),
+    )
+
+def _reject(summary: dict, line_num: int, message: str) -> None:
+    summary["invalid"] += 1
+    if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+        summary["errors"].append(f"line {line_num}: {message}")
+
+def _write_albums(conn, rows: list[dict]) -> None:
+    conn.execute(_upsert(AlbumDB.__table__, ALBUM_FIELDS), rows)
+
+def _write_songs(conn, rows: list[tuple[int, dict]], summary: dict, claimed: bytearray) -> int:
+    """
+    Upsert one chunk of songs; rows without an id are matched on (album_id, name).
+
+    Only songs that existed before the import started can be matched, and
+    each of them once: claimed has a byte per song id, set when a row of this
+    file has taken it, so repeated names in later chunks don't collapse.
+    """
+    album_ids = {row["album_id"] for _, row in rows}
+    genres = dict(conn.execute(select(AlbumDB.id, AlbumDB.genre).where(AlbumDB.id.in_(album_ids))).all())
+    names = {(row["album_id"], row["name"]) for _, row in rows if row["id"] is None}
+    existing = defaultdict(list)
+    if names:
+        for song_id, album_id, name in conn.execute(
+            select(SongDB.id, SongDB.album_id, SongDB.name)
+            .where(tuple_(SongDB.album_id, SongDB.name).in_(names), SongDB.id < len(claimed))
+            .order_by(SongDB.id)
+        ):
+            if not claimed[song_id]:
+                existing[(album_id, name)].append(song_id)
+
+    keyed, fresh = [], []
+    for line_num, row in rows:
+        if row["album_id"] not in genres:
+            _reject(summary, line_num, f"unknown album_id {row['album_id']}")
+            continue
+        row["genre"] = genres[row["album_id"]]
+        if row["id"] is None:
+            # repeated names within an album claim the existing songs in id order
+            matches = existing.get((row["album_id"], row["name"]))
+            if not matches:
+                del row["id"]
+                fresh.append(row)
+                continue
+            row["id"] = matches.pop(0)
+        if row["id"] < len(claimed):
+            claimed[row["id"]] = 1
+        keyed.append(row)
+    if keyed:
+        conn.execute(_upsert(SongDB.__table__, keyed[0]), keyed)
+    if fresh:
+        conn.execute(insert(SongDB.__table__), fresh)
+    return len(keyed) + len(fresh)
+
+def import_file(kind: str, path: str, bind=engine, fmt: str | None = None, chunk_size: int = CHUNK_SIZE,
+                force: bool = False) -> dict:
+    """
+    Stream one file of albums or songs into the database.
+
+    Does not recompute ranks; call finish() once after the last file.
+    """
+    fields = KINDS[kind]
+    path = os.path.abspath(path)
+    checksum = file_checksum(path)
+    summary = {"kind": kind, "path": path, "checksum": checksum, "rows": 0, "invalid": 0, "errors": [],
+               "skipped": False, "seconds": 0.0, "rows_per_sec": 0.0}
+    with bind.connect() as conn:
+        last = conn.execute(
+            select(ImportDB.checksum).where(ImportDB.kind == kind, ImportDB.path == path)
+        ).scalar()
+    if last == checksum and not force:
+        summary["skipped"] = True
+        return summary
+
+    started = time.perf_counter()
+    if kind == "songs":
+        with bind.connect() as conn:
+            claimed = bytearray((conn.execute(select(func.max(SongDB.id))).scalar() or 0) + 1)
+    for chunk in _batched(read_rows(path, fmt), chunk_size):
+        rows = []
+        for line_num, raw in chunk:
+            try:
+                if isinstance(raw, Exception):
+                    raise raw
+                rows.append((line_num, validate(raw, fields)))
+            except ValueError as e:
+                _reject(summary, line_num, str(e))
+        if not rows:
+            continue
+        with bind.connect() as conn:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            if kind == "albums":
+                _write_albums(conn, [row for _, row in rows])
+                summary["rows"] += len(rows)
+            else:
+                summary["rows"] += _write_songs(conn, rows, summary, claimed)
+            conn.commit()
+
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    summary["rows_per_sec"] = round(summary["rows"] / summary["seconds"], 1) if summary["seconds"] else 0.0
+    return summary
+
+def finish(summaries: list[dict], bind=engine) -> None:
+    """Recompute ranks, bump the catalog version and remember the imported checksums."""
+    imported = [s for s in summaries if not s["skipped"]]
+    if not imported:
+        return
+    with bind.connect() as conn:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        # songs carry their album's genre; follow any genre the album import changed
+        conn.execute(
+            update(SongDB.__table__)
+            .values(genre=AlbumDB.genre)
+            .where(SongDB.album_id == AlbumDB.id, SongDB.genre.is_distinct_from(AlbumDB.genre))
+        )
+        compute_ranks(conn)
+        bump_catalog_version(conn)
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+        for s in imported:
+            stmt = upsert(ImportDB.__table__).values(
+                kind=s["kind"], path=s["path"], checksum=s["checksum"], rows=s["rows"], imported_at=stamp,
+            )
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=["kind", "path"],
+                set_={"checksum": stmt.excluded.checksum, "rows": stmt.excluded.rows,
+                      "imported_at": stmt.excluded.imported_at},
+            ))
+        conn.commit()
+
+def run(albums: list[str] = (), songs: list[str] = (), bind=engine, fmt: str | None = None,
+        chunk_size: int = CHUNK_SIZE, force: bool = False) -> list[dict]:
+    """Import album files, then song files (so songs can refer to new albums), then finish()."""
+    Base.metadata.create_all(bind=bind)
+    summaries = [import_file("albums", path, bind, fmt, chunk_size, force) for path in albums]
+    summaries += [import_file("songs", path, bind, fmt, chunk_size, force) for path in songs]
+    finish(summaries, bind)
+    return summaries
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream album and song files into the database.")
+    parser.add_argument("--albums", action="append", default=[], help="CSV or NDJSON file of albums (repeatable)")
+    parser.add_argument("--songs", action="append", default=[], help="CSV or NDJSON file of songs (repeatable)")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="file format; default from the extension")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--force", action="store_true", help="import even if the file is unchanged")
+    args = parser.parse_args()
+    if not args.albums and not args.songs:
+        parser.error("nothing to import; pass --albums and/or --songs")
+
+    for s in run(args.albums, args.songs, fmt=args.format, chunk_size=args.chunk_size, force=args.force):
+        if s["skipped"]:
+            print(f"{s['kind']}: {s['path']} unchanged, skipped")
+            continue
+        print(f"{s['kind']}: {s['rows']} rows from {s['path']} in {s['seconds']}s "
+              f"({s['rows_per_sec']} rows/s), {s['invalid']} invalid")
+        for error in s["errors"]:
+            print(f"  {error}")
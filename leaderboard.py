@@ -0,0 +1,105 @@
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from catalog import Snapshot
+
+ALBUM_FILTERS = ("year", "genre", "artist")
+SONG_FILTERS = ("year", "genre", "artist", "album_id")
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+# filtered boards kept per snapshot, least recently used dropped first
+MAX_CACHED_BOARDS = int(os.environ.get("LEADERBOARD_CACHED_BOARDS", 256))
+
+class Board:
+    """
+    One ranking, best first, with its scores kept ascending for bisect.
+
+    Ranks are positions in (score descending, id ascending) order, the same
+    order the stats table uses for album_rank.
+    """
+
+    __slots__ = ("entries", "scores")
+
+    def __init__(self, entries: list):
+        self.entries = entries
+        self.scores = [e.score for e in reversed(entries)]
+
+    def top(self, limit: int, offset: int = 0) -> list:
+        return self.entries[offset:offset + limit]
+
+    def percentile(self, score: float) -> dict:
+        """Share of entries scoring strictly below score, and the rank score would take."""
+        count = len(self.scores)
+        below = bisect_left(self.scores, score)
+        above = count - bisect_right(self.scores, score)
+        return {
+            "score": score,
+            "count": count,
+            "rank": above + 1,
+            "percentile": round(100 * below / count, 2) if count else 0.0,
+        }
+
+def _album_value(snapshot: Snapshot, album, field: str):
+    value = getattr(album, field)
+    return value.lower() if field == "artist" else value
+
+def _song_value(snapshot: Snapshot, song, field: str):
+    if field in ("year", "artist"):
+        album = snapshot.albums_by_id.get(song.album_id)
+        if album is None:
+            return None
+        return _album_value(snapshot, album, field)
+    return getattr(song, field)
+
+_cache_lock = threading.Lock()
+_cache_snapshot: Snapshot | None = None
+# the unfiltered board per collection, kept for the whole snapshot
+_overall: dict[str, Board] = {}
+_boards: OrderedDict[tuple, Board] = OrderedDict()
+
+def board(snapshot: Snapshot, collection: str, filters: dict) -> Board:
+    """
+    The leaderboard of "albums" or "songs" restricted to filters, e.g.
+    {"genre": "rap", "year": 2020}.
+
+    The unfiltered board is sorted once per snapshot; each filtered board is
+    cut from it on first use (one O(n) pass) and cached until the catalog
+    changes, up to MAX_CACHED_BOARDS of them.
+    """
+    global _cache_snapshot, _overall, _boards
+    filters = {k: (v.lower() if k == "artist" else v) for k, v in filters.items() if v is not None}
+    key = (collection, tuple(sorted(filters.items())))
+    with _cache_lock:
+        if _cache_snapshot is not snapshot:
+            _cache_snapshot, _overall, _boards = snapshot, {}, OrderedDict()
+        overall = _overall.get(collection)
+        found = _boards.get(key)
+        if found is not None:
+            _boards.move_to_end(key)
+    if not filters and overall is not None:
+        return overall
+    if found is not None:
+        return found
+
+    if overall is None:
+        overall = Board(sorted(getattr(snapshot, collection), key=lambda r: (-r.score, r.id)))
+    if not filters:
+        with _cache_lock:
+            if _cache_snapshot is snapshot:
+                _overall[collection] = overall
+        return overall
+
+    value_of = _album_value if collection == "albums" else _song_value
+    found = Board([
+        r for r in overall.entries
+        if all(value_of(snapshot, r, field) == wanted for field, wanted in filters.items())
+    ])
+    with _cache_lock:
+        if _cache_snapshot is snapshot:
+            _overall[collection] = overall
+            _boards[key] = found
+            while len(_boards) > MAX_CACHED_BOARDS:
+                _boards.popitem(last=False)
+    return found
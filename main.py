@@ -1,287 +1,75 @@
-from enum import Enum
+import asyncio
+import json
+import math
+import os
+from contextlib import asynccontextmanager
 from typing import Optional
-from fastapi import FastAPI, HTTPException, Depends, Request
-from pydantic import BaseModel
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
+from fastapi import FastAPI, HTTPException, Depends, Header, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from sqlalchemy import event
+from sqlalchemy.orm import Session, selectinload, noload
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 
-import csv
-from PIL import Image
-import os
-from fastapi.responses import StreamingResponse
-from io import BytesIO
-
-DATABASE_URL = "sqlite:///./albums.db"
-
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-class Genre(str, Enum):
-    rock = "rock"
-    pop = "pop"
-    jazz = "jazz"
-    classical = "classical"
-    rap = "rap"
-    rnb = "rnb"
-    musical = "musical"
-    edm = "edm"
-    psychedelic = "psychedelic"
-    lofi = "lofi"
-    soul = "soul"
-    hip_hop = "hip_hop"
-    other = "other"
-
-class StatsDB(Base):
-    __tablename__ = "stats"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    album_id = Column(Integer, ForeignKey("albums.id"))
-    album_rank = Column(Integer)
-    highest_song_rank = Column(Integer)
-    rank_in_year = Column(Integer)
-    rank_in_genre = Column(Integer)
-    album = relationship("AlbumDB", back_populates="stats")
-
-class SongStatsDB(Base):
-    __tablename__ = "song_stats"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    song_id = Column(Integer, ForeignKey("songs.id"))
-    song_rank = Column(Integer)
-    album_rank = Column(Integer)
+from fastapi.responses import Response, JSONResponse, FileResponse
+from starlette.concurrency import run_in_threadpool
+
+from models import (SessionLocal, ReadSessionLocal, Genre, StatsDB, SongDB, AlbumDB, Stats, Song, Album,
+                    SearchHit, AlbumCreate, AlbumUpdate, SongCreate, SongUpdate, LeaderboardAlbum, LeaderboardSong,
+                    Percentile, AlbumBatch, SongBatch, StatsBatch, AlbumGroup, SongGroup, Histogram, SimilarAlbum,
+                    SpriteAtlas)
+from bootstrap import bootstrap
+from catalog import Snapshot, get_snapshot, current_snapshot, bump_catalog_version, expire_version
+from response_cache import ResponseCacheMiddleware
+import leaderboard
+from ranks import AlbumPlacement, place_album, place_song
+import search
+from pagination import (DEFAULT_LIMIT, clamp_limit, parse_sort, parse_fields, keyset_page, keyset_slice,
+                        split_page, review_date_key, review_date_sql)
+from http_cache import etag_matches
+import images
+import metrics
+import export
+import analytics
+import similar
 
-class SongDB(Base):
-    __tablename__ = "songs"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True)
-    score = Column(Float)
-    album_id = Column(Integer, ForeignKey("albums.id"))
-    song_rank = Column(Integer, ForeignKey("song_stats.song_rank"))
-    genre = Column(String)
-    album = relationship("AlbumDB", back_populates="songs")
-
-class AlbumDB(Base):
-    __tablename__ = "albums"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, index=True)
-    artist = Column(String)
-    image_url = Column(String, default="")
-    year = Column(Integer)
-    score = Column(Float)
-    personal = Column(Float, default=0.0)
-    mean = Column(Float, default=0.0)
-    leng = Column(String, default=0)
-    rec = Column(String, default="")
-    review_date = Column(String, default="")
-    stats = relationship("StatsDB", back_populates="album")
-    genre = Column(String)
-    songs = relationship("SongDB", back_populates="album")
-
-class Stats(BaseModel):
-    album_rank: int
-    highest_song_rank: int
-    rank_in_year: int
-    rank_in_genre: int
-
-    class Config:
-        orm_mode = True
-
-class Song(BaseModel):
-    id: int
-    name: str
-    score: float
-    album_id: int
-    song_rank: int
-    genre: Genre
-    
-    class Config:
-        from_attributes = True
-
-class Album(BaseModel):
-    id: int
-    title: str
-    artist: str
-    image_url: str = ""
-    year: int
-    score: float
-    personal: float = 0.0
-    mean: float = 0.0
-    leng: str = "0"
-    rec: str = ""
-    review_date: str = ""
-    stats: list[Stats] = []
-    genre: Genre
-    songs: list[Song] = []
-    
-    class Config:
-        from_attributes = True
+def get_db():
+    # read endpoints get query_only connections from the read pool
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
 
-Base.metadata.create_all(bind=engine)
+def begin_immediate(session, transaction, connection):
+    connection.exec_driver_sql("BEGIN IMMEDIATE")
 
-def get_db():
+def get_write_db():
+    # Take SQLite's write lock as the first statement of the transaction so rank
+    # reads and shifts can't interleave with another worker's write. FastAPI
+    # resolves this before validating the body, so the lock waits for first use:
+    # a request that gets a 422 never queues behind other writers. Reads after
+    # the commit are plain deferred transactions. Not committing rolls everything back.
     db = SessionLocal()
+    event.listen(db, "after_begin", begin_immediate, once=True)
     try:
         yield db
     finally:
-        # Check if data already exists
-        existing_songs = db.query(SongDB).first()
-        existing_albums = db.query(AlbumDB).first()
-        existing_stats = db.query(StatsDB).first()
-        
-        if existing_songs is None or existing_albums is None:
-            # Add albums to database first, so song genres can reference them
-            albums = [
-                Album(id=1, title="Shoot For The Stars, Aim For The Moon", artist="Pop Smoke", image_url="/image/1.jpg", year=2020, score=81.79, personal=8.2, mean=8.16, leng="56:41", rec="Yes", review_date="10-09-2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=2, title="GOD DID", artist="DJ Khaled", image_url="/image/2.jpg", year=2022, score=52.95, personal=4.0, mean=6.59, leng="57:11", rec="Only a few songs, not every", review_date="10-09-2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=3, title="Doo-Wops & Hooligans", artist="Bruno Mars", image_url="/image/3.jpg", year=2010, score=94.40, personal=9.5, mean=9.38, leng="35:26", rec="ABSOLUTELY, LISTEN TO THIS!", review_date="10-09-2022", genre=Genre.pop, stats=[], songs=[]),
-                Album(id=4, title="Spider-Man: Into the Spider-Verse", artist="Various Artists", image_url="/image/4.jpg", year=2018, score=79.00, personal=7.8, mean=8.00, leng="41:41", rec="Its a surprising one so ye :>", review_date="10-10-2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=5, title="TIM", artist="Avicii", image_url="/image/5.jpg", year=2019, score=81.79, personal=8.1, mean=8.26, leng="38:58", rec="If you like EDM, you like TIM", review_date="10-10-2022", genre=Genre.edm, stats=[], songs=[]),
-                Album(id=6, title="Music Of The Spheres", artist="Coldplay", image_url="/image/6.jpg", year=2021, score=68.83, personal=7.0, mean=6.77, leng="41:50", rec="Anything but the emojis", review_date="10-10-2022", genre=Genre.pop, stats=[], songs=[]),
-                Album(id=7, title="Parachutes", artist="Coldplay", image_url="/image/7.jpg", year=2000, score=77.80, personal=7.6, mean=7.96, leng="41:55", rec="Listen until Parachutes", review_date="10-10-2022", genre=Genre.pop, stats=[], songs=[]),
-                Album(id=8, title="Ghost Stories", artist="Coldplay", image_url="/image/8.jpg", year=2014, score=85.00, personal=8.5, mean=8.50, leng="40:18", rec="Some but yes", review_date="10-10-2022", genre=Genre.pop, stats=[], songs=[]),
-                Album(id=9, title="Legends Never Die", artist="Juice WRLD", image_url="/image/9.jpg", year=2020, score=93.14, personal=9.6, mean=9.03, leng="58:48", rec="you're gonna jus have to listen to it", review_date="10-10-2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=10, title="BALLADS 1", artist="Joji", image_url="/image/10.jpg", year=2018, score=80.67, personal=8.0, mean=8.13, leng="35:11", rec="Yes", review_date="10-10-2022", genre=Genre.rnb, stats=[], songs=[]),
-                Album(id=11, title="17", artist="XXXTENTACION", image_url="/image/11.jpg", year=2017, score=89.18, personal=9.0, mean=8.84, leng="21:59", rec="Yess", review_date="10-10-2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=12, title="Nectar", artist="Joji", image_url="/image/12.jpg", year=2020, score=82.28, personal=8.3, mean=8.16, leng="53:14", rec="YESS", review_date="10/17/2022", genre=Genre.rnb, stats=[], songs=[]),
-                Album(id=13, title="Circles", artist="Mac Miller", image_url="/image/13.jpg", year=2020, score=94.00, personal=9.7, mean=9.10, leng="48:44", rec="Look at the score, thats it", review_date="10/17/2022", genre=Genre.rnb, stats=[], songs=[]),
-                Album(id=14, title="K.I.D.S. (Deluxe)", artist="Mac Miller", image_url="/image/14.jpg", year=2018, score=81.33, personal=8.2, mean=8.07, leng="54:00", rec="a blast from the past, listen", review_date="10/17/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=15, title="JACKBOYS", artist="JACKBOYS", image_url="/image/15.jpg", year=2019, score=84.93, personal=8.5, mean=8.49, leng="21:22", rec="Fire", review_date="10/27/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=16, title="SKINS", artist="XXXTENTACION", image_url="/image/16.jpg", year=2018, score=72.20, personal=7.0, mean=7.44, leng="19:47", rec="Not the whole album. But yes?", review_date="10/17/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=17, title="?", artist="XXXTENTACION", image_url="/image/17.jpg", year=2017, score=85.94, personal=8.7, mean=8.49, leng="37:35", rec="If you're sad sure lol", review_date="10/17/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=18, title="CALM", artist="5SOS", image_url="/image/18.jpg", year=2020, score=75.15, personal=7.0, mean=8.03, leng="43:31", rec="Some songs not all", review_date="10/17/2022", genre=Genre.pop, stats=[], songs=[]),
-                Album(id=19, title="Swimming", artist="Mac Miller", image_url="/image/19.jpg", year=2018, score=91.46, personal=9.3, mean=8.99, leng="58:39", rec="LISTEN TO THIS ALBUM", review_date="10/17/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=20, title="IGOR", artist="Tyler, The Creator", image_url="/image/20.jpg", year=2019, score=85.88, personal=8.7, mean=8.48, leng="39:46", rec="Yesssss", review_date="10/18/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=21, title="Life After The Show", artist="YourBoySponge", image_url="/image/21.jpg", year=2023, score=70.09, personal=7.0, mean=7.02, leng="33:51", rec="If you want a laugh yea", review_date="10/19/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=22, title="Fighting Demons (DELUXE)", artist="Juice WRLD", image_url="/image/22.jpg", year=2023, score=86.50, personal=8.7, mean=8.60, leng="1:14:00", rec="YES", review_date="10/21/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=23, title="GB&GR", artist="Juice WRLD", image_url="/image/23.jpg", year=2020, score=93.03, personal=9.5, mean=9.11, leng="47:30", rec="YESSSS", review_date="10/21/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=24, title="B.I.B.L.E.", artist="Fivio Foreign", image_url="/image/24.jpg", year=2022, score=70.67, personal=6.8, mean=7.33, leng="53:36", rec="Some not all", review_date="10/24/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=25, title="Curious George", artist="Jack Johnson", image_url="/image/25.jpg", year=2006, score=84.81, personal=8.5, mean=8.46, leng="40:06", rec="YES", review_date="10/25/2022", genre=Genre.pop, stats=[], songs=[]),
-                Album(id=26, title="homemade", artist="mamerico", image_url="/image/26.jpg", year=2019, score=84.19, personal=8.4, mean=8.44, leng="29:02", rec="for comfort, yes", review_date="10/26/2022", genre=Genre.jazz, stats=[], songs=[]),
-                Album(id=27, title="Two / Seven", artist="Aso", image_url="/image/27.jpg", year=2020, score=87.86, personal=8.8, mean=8.77, leng="26:11", rec="for comfort, yes", review_date="10/27/2022", genre=Genre.lofi, stats=[], songs=[]),
-                Album(id=28, title="Trip At Knight", artist="Trippie Redd", image_url="/image/28.jpg", year=2021, score=68.89, personal=6.5, mean=7.28, leng="49:36", rec="if its high, listen to it", review_date="10/28/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=29, title="FOTO", artist="Kota the Friend", image_url="/image/29.jpg", year=2021, score=76.34, personal=7.5, mean=7.77, leng="59:57", rec="Sure if you want something new", review_date="10/28/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=30, title="I Love Life Thank You", artist="Mac Miller", image_url="/image/30.jpg", year=2020, score=86.62, personal=8.8, mean=8.52, leng="36:17", rec="YESSS", review_date="10/28/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=31, title="La La Land", artist="Various Artists", image_url="/image/31.jpg", year=2016, score=89.73, personal=9.1, mean=8.85, leng="36:17", rec="YESSS", review_date="10/28/2022", genre=Genre.musical, stats=[], songs=[]),
-                Album(id=32, title="THE GOAT", artist="Polo G", image_url="/image/32.jpg", year=2023, score=81.87, personal=8.0, mean=8.37, leng="47:10", rec="YESSS", review_date="10/28/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=33, title="B4 The Storm", artist="Internet Money", image_url="/image/33.jpg", year=2021, score=65.46, personal=7.0, mean=6.09, leng="48:13", rec="Not really", review_date="10/29/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=34, title="A Love Letter To You 4", artist="Trippie Redd", image_url="/image/34.jpg", year=2019, score=83.45, personal=8.3, mean=8.39, leng="59:08", rec="Yeah", review_date="10/31/2022", genre=Genre.hip_hop, stats=[], songs=[]),
-                Album(id=35, title="Donda", artist="Kanye West", image_url="/image/35.jpg", year=2021, score=74.04, personal=7.0, mean=7.81, leng="1:48:00", rec="Not the full thing, some tho", review_date="10/31/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=36, title="SMITHEREENS", artist="Joji", image_url="/image/36.jpg", year=2017, score=86.33, personal=8.4, mean=8.87, leng="24:23", rec="EYSSSSS", review_date="11/4/2022", genre=Genre.soul, stats=[], songs=[]),
-                Album(id=37, title="A Head Full Of Dreams", artist="Coldplay", image_url="/image/37.jpg", year=2015, score=82.45, personal=8.0, mean=8.49, leng="45:50", rec="YESSS", review_date="11/10/2022", genre=Genre.pop, stats=[], songs=[]),
-                Album(id=38, title="DR4L", artist="Juice WRLD", image_url="/image/38.jpg", year=2020, score=87.70, personal=8.9, mean=8.64, leng="1:15:00", rec="YES", review_date="12/9/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=39, title="Punk", artist="Young Thug", image_url="/image/39.jpg", year=2021, score=66.35, personal=6.4, mean=6.87, leng="1:03:00", rec="Ehhhh", review_date="12/9/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=40, title="÷ (DELUXE)", artist="Ed Sheeran", image_url="/image/40.jpg", year=2017, score=90.19, personal=9.0, mean=9.04, leng="59:33", rec="YESSSSSSSSS", review_date="12/10/2022", genre=Genre.pop, stats=[], songs=[]),
-                Album(id=41, title="x (DELUXE)", artist="Ed Sheeran", image_url="/image/41.jpg", year=2014, score=85.44, personal=8.3, mean=8.79, leng="1:05:00", rec="Yes", review_date="12/10/2022", genre=Genre.rnb, stats=[], songs=[]),
-                Album(id=42, title="Her Loss", artist="Drake & 21 Savage", image_url="/image/42.jpg", year=2022, score=81.53, personal=7.8, mean=8.51, leng="1:00:00", rec="Eh Yeah", review_date="12/10/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=43, title="Yeezus", artist="Kanye West", image_url="/image/43.jpg", year=2013, score=77.05, personal=7.2, mean=8.21, leng="1:08:00", rec="Look at the notable songs", review_date="12/10/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=44, title="channel ORANGE", artist="Frank Ocean", image_url="/image/44.jpg", year=2012, score=86.24, personal=8.9, mean=8.35, leng="55:47", rec="ye", review_date="12/10/2022", genre=Genre.rnb, stats=[], songs=[]),
-                Album(id=45, title="Best Day Ever", artist="Mac Miller", image_url="/image/45.jpg", year=2010, score=83.22, personal=8.2, mean=8.44, leng="51:24", rec="Yeah", review_date="12/10/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=46, title="HEROES & VILLIANS", artist="Metro Boomin", image_url="/image/46.jpg", year=2022, score=84.60, personal=8.3, mean=8.62, leng="48:04", rec="YESSS", review_date="12/10/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=47, title="Graduation", artist="Kanye West", image_url="/image/47.jpg", year=2007, score=91.68, personal=9.4, mean=8.94, leng="54:29", rec="ABSOLUTELY", review_date="12/10/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=48, title="Its Almost Dry", artist="Pusha T", image_url="/image/48.jpg", year=2022, score=82.67, personal=8.0, mean=8.53, leng="35:53", rec="Yeah", review_date="12/10/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=49, title="MBDTF", artist="Kanye West", image_url="/image/49.jpg", year=2010, score=89.19, personal=9.0, mean=8.84, leng="1:08:00", rec="YESS", review_date="12/11/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=50, title="Good Job", artist="Cookin Soul", image_url="/image/50.jpg", year=2020, score=81.30, personal=8.0, mean=8.26, leng="24:15", rec="If you wanna spice up your playlist", review_date="12/20/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=51, title="JESUS IS KING", artist="Kanye West", image_url="/image/51.jpg", year=2019, score=72.14, personal=6.5, mean=7.93, leng="27:04", rec="Ehhhh", review_date="12/30/2022", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=52, title="Cheers to the Best Memories", artist="dvsn & TD$", image_url="/image/52.jpg", year=2023, score=80.50, personal=8.0, mean=8.10, leng="32:18", rec="Ehhhh", review_date="1/20/2023", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=53, title="MANSION MUSIK", artist="Trippie Redd", image_url="/image/53.jpg", year=2023, score=63.40, personal=5.0, mean=7.68, leng="1:16:00", rec="the first 5 songs, and colors", review_date="1/20/2023", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=54, title="Starboy", artist="The Weeknd", image_url="/image/54.jpg", year=2016, score=90.39, personal=9.2, mean=8.88, leng="1:08:00", rec="Absolutely", review_date="1/24/2023", genre=Genre.pop, stats=[], songs=[]),
-                Album(id=55, title="Like..?", artist="Ice Spice", image_url="/image/55.jpg", year=2023, score=47.25, personal=3.0, mean=6.45, leng="13:08", rec="Do not and I MEAN DO NOT LISTEN TO THIS", review_date="1/26/2023", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=56, title="Let's Start Here.", artist="Lil Yachty", image_url="/image/56.jpg", year=2023, score=88.68, personal=9.0, mean=8.74, leng="57:16", rec="Yes", review_date="1/28/2023", genre=Genre.psychedelic, stats=[], songs=[]),
-                Album(id=57, title="i am > i was", artist="21 Savage", image_url="/image/57.jpg", year=2018, score=83.53, personal=8.0, mean=8.71, leng="51:05", rec="Yes", review_date="1/30/2023", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=58, title="Meet The Woo", artist="Pop Smoke", image_url="/image/58.jpg", year=2019, score=72.22, personal=7.3, mean=8.14, leng="34:13", rec="Ehhhh", review_date="7/27/2023", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=59, title="MOTM", artist="Kid Cudi", image_url="/image/59.jpg", year=2009, score=89.33, personal=9.0, mean=8.87, leng="58:33", rec="Yes", review_date="7/27/2023", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=60, title="Whole Lotta Red", artist="Playboi Carti", image_url="/image/60.jpg", year=2020, score=77.63, personal=7.3, mean=8.23, leng="56:33", rec="no...", review_date="7/29/2023", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=61, title="UTOPIA", artist="Travis Scott", image_url="/image/61.jpg", year=2023, score=87.18, personal=8.7, mean=8.74, leng="56:33", rec="Yes", review_date="7/28/2023", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=62, title="Austin", artist="Post Malone", image_url="/image/62.jpg", year=2023, score=87.10, personal=0.0, mean=0.00, leng="56:33", rec="Not yet", review_date="9/3/2023", genre=Genre.pop, stats=[], songs=[]),
-                Album(id=63, title="SpiderMan: Across the Spider-Verse", artist="Metro Boomin", image_url="/image/63.jpg", year=2023, score=85.22, personal=8.5, mean=8.54, leng="56:33", rec="Yes", review_date="9/1/2023", genre=Genre.hip_hop, stats=[], songs=[]),
-                Album(id=64, title="Flower Boy", artist="Tyler, The Creator", image_url="/image/64.jpg", year=2017, score=87.42, personal=8.7, mean=8.77, leng="56:33", rec="Yes", review_date="8/29/2023", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=65, title="Moon Music", artist="Coldplay", image_url="/image/65.jpg", year=2024, score=75.10, personal=7.0, mean=8.02, leng="56:33", rec="Ehhh", review_date="10/25/2024", genre=Genre.pop, stats=[], songs=[]),
-                Album(id=66, title="GNX", artist="Kendrick Lamar", image_url="/image/66.jpg", year=2024, score=90.63, personal=9.0, mean=9.13, leng="56:33", rec="Yes", review_date="11/22/2024", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=67, title="CHROMAKOPIA", artist="Tyler, The Creator", image_url="/image/67.jpg", year=2024, score=87.32, personal=8.7, mean=8.76, leng="56:33", rec="Yes", review_date="10/28/2024", genre=Genre.rap, stats=[], songs=[]),
-                Album(id=68, title="Unorthodox Jukebox", artist="Bruno Mars", image_url="/image/68.jpg", year=2012, score=93.90, personal=9.6, mean=9.18, leng="56:33", rec="Yes", review_date="6/3/2025", genre=Genre.pop, stats=[], songs=[]),
-                Album(id=69, title="Random Access Memories", artist="Daft Punk", image_url="/image/69.jpg", year=2013, score=90.50, personal=9.2, mean=8.90, leng="56:33", rec="Yes", review_date="6/3/2025", genre=Genre.edm, stats=[], songs=[]),
-                Album(id=70, title="The Stranger", artist="Billy Joel", image_url="/image/70.jpg", year=1977, score=95.17, personal=9.6, mean=9.43, leng="56:33", rec="F*CKING YES!", review_date="10/21/2025", genre=Genre.pop, stats=[], songs=[]),
-            ]
-
-            for album in albums:
-                db_album = AlbumDB(
-                    id=album.id,
-                    title=album.title,
-                    artist=album.artist,
-                    image_url=album.image_url,
-                    year=album.year,
-                    score=album.score,
-                    personal=album.personal,
-                    mean=album.mean,
-                    leng=album.leng,
-                    rec=album.rec,
-                    review_date=album.review_date,
-                    genre=album.genre.value
-                )
-                db.merge(db_album)
-            db.commit()
-
-            # load songs from CSV, assigning genre from album
-            try:
-                with open('songs.csv','r',encoding='utf-8') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        alb = db.query(AlbumDB).filter(AlbumDB.id==int(row['album_id'])).first()
-                        song_genre = alb.genre if alb else ""
-                        song = SongDB(
-                            name=row['name'],
-                            score=float(row['score']),
-                            album_id=int(row['album_id']),
-                            genre=song_genre
-                        )
-                        db.merge(song)
-                db.commit()
-            except FileNotFoundError:
-                pass
-
-            # compute and store stats if table empty
-            if existing_stats is None:
-                # create map of song ranks
-                all_songs = db.query(SongDB).order_by(SongDB.score.desc()).all()
-                song_rank_map = {s.id: idx for idx, s in enumerate(all_songs, start=1)}
-                
-                # update song_rank in SongDB
-                for song in all_songs:
-                    song.song_rank = song_rank_map[song.id]
-                    db.merge(song)
-                db.commit()
-                
-                # overall album ranking by score
-                all_albums_list = db.query(AlbumDB).order_by(AlbumDB.score.desc()).all()
-                for idx, alb in enumerate(all_albums_list, start=1):
-                    year_list = db.query(AlbumDB).filter(AlbumDB.year == alb.year).order_by(AlbumDB.score.desc()).all()
-                    rank_year = next((i for i,a in enumerate(year_list, start=1) if a.id == alb.id), 0) # type: ignore
-                    genre_list = db.query(AlbumDB).filter(AlbumDB.genre == alb.genre).order_by(AlbumDB.score.desc()).all()
-                    rank_genre = next((i for i,a in enumerate(genre_list, start=1) if a.id == alb.id), 0) # type: ignore
-                    album_songs = db.query(SongDB).filter(SongDB.album_id == alb.id).all()
-                    if album_songs:
-                        highest_song_rank = min(song_rank_map[s.id] for s in album_songs)
-                    else:
-                        highest_song_rank = 0
-                    stats_entry = StatsDB(
-                        album_id=alb.id,
-                        album_rank=idx,
-                        highest_song_rank=highest_song_rank,
-                        rank_in_year=rank_year,
-                        rank_in_genre=rank_genre
-                    )
-                    db.add(stats_entry)
-                db.commit()
-        
         db.close()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    bootstrap()
+    # build the similarity index (and the analytics columns under it) before taking traffic
+    await run_in_threadpool(similar.current_index)
+    if os.environ.get("IMAGE_PRERENDER_ON_STARTUP"):
+        images.prerender_in_background()
+    yield
+    images.shutdown()
+    metrics.flush()
+    metrics.flush_slow_requests()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost.tiangolo.com",
@@ -290,6 +78,9 @@ origins = [
     "http://localhost:5173",
 ]
 
+# added first so it sits inside CORS and cached responses still get CORS headers
+app.add_middleware(ResponseCacheMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -298,106 +89,451 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.get("/image/{image_name}")
-def get_image(image_name: str, width: Optional[int] = None, height: Optional[int] = None, quality: int = 85):
+# added last so its timings cover every other middleware
+app.add_middleware(metrics.MetricsMiddleware)
+
+def json_safe(value) -> bool:
+    try:
+        json.dumps(value, allow_nan=False, default=str)
+    except ValueError:
+        return False
+    return True
+
+@app.exception_handler(RequestValidationError)
+async def validation_error(request, exc: RequestValidationError):
+    """FastAPI's usual 422, minus echoed inputs JSON can't carry (NaN and Infinity bodies)."""
+    errors = [e if json_safe(e.get("input")) else {k: v for k, v in e.items() if k != "input"} for e in exc.errors()]
+    return JSONResponse(status_code=422, content={"detail": jsonable_encoder(errors)})
+
+def album_covers(db: Session, ids: list[int]) -> dict[int, str]:
+    """Album id -> cover file for the albums that exist and have a cover on disk."""
+    covers = {}
+    for album_id, image_url in db.query(AlbumDB.id, AlbumDB.image_url).filter(AlbumDB.id.in_(ids)):
+        try:
+            covers[album_id] = images.resolve_source(os.path.basename(image_url or ""))
+        except (ValueError, FileNotFoundError):
+            continue
+    return covers
+
+@app.get("/image/sprite", response_model=SpriteAtlas)
+async def get_sprite(ids: list[int] = Query(), size: int = images.SPRITE_TILE_SIZE, columns: Optional[int] = None,
+                     quality: int = images.DEFAULT_QUALITY, format: str = "jpeg", db: Session = Depends(get_db)):
+    """
+    Compose the covers of up to 100 albums into one sprite and return its atlas.
+
+    Each cover is cropped to a size x size tile (default 150). The atlas gives
+    the sprite URL, which is immutable and cacheable forever, and every album's
+    tile offset. Albums without a cover are listed under missing.
+    """
+    if len(ids) > images.SPRITE_MAX_TILES:
+        raise HTTPException(status_code=400, detail=f"At most {images.SPRITE_MAX_TILES} ids per sprite")
+    if not 1 <= size <= images.SPRITE_MAX_TILE_SIZE:
+        raise HTTPException(status_code=400, detail=f"size must be between 1 and {images.SPRITE_MAX_TILE_SIZE}")
+    fmt = format.lower()
+    if fmt not in images.SUPPORTED_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, expected one of {images.SUPPORTED_FORMATS}")
+    ids = list(dict.fromkeys(ids))
+    covers = await run_in_threadpool(album_covers, db, ids)
+    placed = [album_id for album_id in ids if album_id in covers]
+    atlas = {"url": None, "width": 0, "height": 0, "tiles": {}, "missing": [i for i in ids if i not in covers]}
+    if not placed:
+        return atlas
+
+    quality = max(1, min(100, quality))
+    columns, rows = images.sprite_layout(len(placed), columns)
+    if columns * size * rows * size > images.MAX_OUTPUT_PIXELS:
+        raise HTTPException(status_code=400, detail=f"Sprite exceeds {images.MAX_OUTPUT_PIXELS} pixels")
+    paths = [covers[album_id] for album_id in placed]
+    key = await run_in_threadpool(images.sprite_key, paths, size, columns, quality, fmt)
+    name = images.sprite_name(key, fmt)
+    # render once; after that the file on disk is all the image route needs
+    if await run_in_threadpool(images.sprite_file, name) is None:
+        try:
+            future = images.submit_sprite(paths, key, size, columns, quality, fmt)
+        except images.RenderQueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        _, timings = await asyncio.shield(asyncio.wrap_future(future))
+        metrics.record_image("render", timings)
+
+    atlas.update(
+        url=f"/image/sprite/{name}",
+        width=columns * size,
+        height=rows * size,
+        tiles={
+            album_id: {"x": (i % columns) * size, "y": (i // columns) * size, "width": size, "height": size}
+            for i, album_id in enumerate(placed)
+        },
+    )
+    return atlas
+
+@app.api_route("/image/sprite/{sprite_name}", methods=["GET", "HEAD"])
+def get_sprite_image(sprite_name: str):
+    """The sprite image an atlas points to, streamed straight from the rendition cache."""
+    found = images.sprite_file(sprite_name)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Sprite not found")
+    path, media_type = found
+    return FileResponse(path, media_type=media_type, headers={"Cache-Control": images.SPRITE_CACHE_CONTROL})
+
+@app.api_route("/image/{image_name}", methods=["GET", "HEAD"])
+async def get_image(image_name: str, width: Optional[int] = None, height: Optional[int] = None,
+                    quality: Optional[int] = None, format: Optional[str] = None, progressive: bool = False,
+                    accept: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
     """
     Get an image with optional resizing and quality adjustment.
     
     Query parameters:
     - width: desired width in pixels (optional)
     - height: desired height in pixels (optional)
-    - quality: JPEG quality 1-100 (default: 85)
+    - quality: encoder quality 1-100 (default: 85)
+    - format: jpeg, webp or avif (optional, otherwise negotiated from the Accept header)
+    - progressive: emit a progressive JPEG (default: false)
+
+    Without any of these (or with only the source's own format) the original
+    file is sent as is, with Range and HEAD support and no decoding.
+
+    Rendered variants are cached in memory and on disk and carry a strong ETag,
+    so a matching If-None-Match is answered with 304 Not Modified. Cache misses
+    are rendered in a separate process pool; oversized requests get a 400 and a
+    full render queue a 503.
     """
-    try:
-        image_path = os.path.join("static", image_name)
-        
-        # Security check: prevent directory traversal
-        if not os.path.abspath(image_path).startswith(os.path.abspath("static")):
-            raise HTTPException(status_code=400, detail="Invalid image path")
-        
-        if not os.path.exists(image_path):
-            raise HTTPException(status_code=404, detail="Image not found")
-        
-        # Open the image
-        img = Image.open(image_path)
-        
-        # Resize if width or height specified
-        if width is not None or height is not None:
-            if width is not None and height is not None:
-                img = img.resize((width, height), Image.Resampling.LANCZOS)
-            elif width is not None:
-                ratio = img.height / img.width
-                img = img.resize((width, int(width * ratio)), Image.Resampling.LANCZOS)
-            elif height is not None:
-                ratio = img.width / img.height
-                img = img.resize((int(height * ratio), height), Image.Resampling.LANCZOS)
-        
+    original = width is None and height is None and quality is None and not progressive \
+        and (format is None or format.lower() == images.source_format(image_name))
+    transform = ()
+    if not original:
         # Ensure quality is in valid range
-        quality = max(1, min(100, quality))
-        
-        # Save to BytesIO
-        img_io = BytesIO()
-        img.save(img_io, format="JPEG", quality=quality)
-        img_io.seek(0)
-        
-        return StreamingResponse(img_io, media_type="image/jpeg")
-    
+        quality = max(1, min(100, images.DEFAULT_QUALITY if quality is None else quality))
+        if format is None:
+            fmt = images.negotiate_format(accept)
+        elif format.lower() in images.SUPPORTED_FORMATS:
+            fmt = format.lower()
+        else:
+            raise HTTPException(status_code=400,
+                                detail=f"Unsupported format, expected one of {images.SUPPORTED_FORMATS}")
+        transform = (width, height, quality, fmt, progressive)
+
+    # everything that touches the file (stat, header read) runs off the event loop
+    try:
+        image_path, key = await run_in_threadpool(images.locate, image_name, *transform)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid image path")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    if original:
+        etag = f'"{key}"'
+        headers = {"ETag": etag, "Cache-Control": images.CACHE_CONTROL}
+        if etag_matches(if_none_match, etag):
+            metrics.record_image("not_modified")
+            return Response(status_code=304, headers=headers)
+        metrics.record_image("original")
+        return FileResponse(image_path, headers=headers)
+
+    media_type = images.FORMATS[fmt][1]
+    try:
+        etag = f'"{key}"'
+        headers = {"ETag": etag, "Cache-Control": images.CACHE_CONTROL, "Vary": "Accept"}
+        if etag_matches(if_none_match, etag):
+            metrics.record_image("not_modified")
+            return Response(status_code=304, headers=headers)
+
+        data = images.memory_cache.get(key)
+        source = "memory"
+        if data is None:
+            data = await run_in_threadpool(images.cached_rendition, key, fmt)
+            source = "disk"
+        if data is None:
+            await run_in_threadpool(images.check_admission, image_path, width, height)
+            future = images.submit_rendition(image_path, key, width, height, quality, fmt, progressive)
+            # shield so a disconnecting client doesn't cancel a render others are waiting on
+            data, timings = await asyncio.shield(asyncio.wrap_future(future))
+            metrics.record_image("render", timings)
+        else:
+            metrics.record_image(source)
+        return Response(content=data, media_type=media_type, headers=headers)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except images.ImageTooLarge as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except images.RenderQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus metrics, summed over all workers."""
+    return Response(content=metrics.render(metrics.collect()), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/")
 def read_root():
     return {"Hello": "World"}
 
+ALBUM_RELATIONS = ("songs", "stats")
+
+def parse_include(include: Optional[str]) -> set[str]:
+    """Relationships to embed in Album responses: all by default, none for include= (empty)."""
+    if include is None:
+        return set(ALBUM_RELATIONS)
+    wanted = {part.strip() for part in include.split(",") if part.strip()}
+    unknown = wanted - set(ALBUM_RELATIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include {sorted(unknown)}, expected {list(ALBUM_RELATIONS)}")
+    return wanted
+
+def album_query(db: Session, include: set[str]):
+    # Load each wanted relationship for the whole result in one extra query
+    # instead of lazily per album; skipped relationships are never queried.
+    query = db.query(AlbumDB)
+    for name in ALBUM_RELATIONS:
+        relation = getattr(AlbumDB, name)
+        query = query.options(selectinload(relation) if name in include else noload(relation))
+    return query
+
+def trim_albums(albums, include: set[str]):
+    """Drop relationships the client didn't ask for from snapshot records."""
+    if len(include) == len(ALBUM_RELATIONS):
+        return albums
+    empty = {name: () for name in ALBUM_RELATIONS if name not in include}
+    return [a._replace(**empty) for a in albums]
+
+ALBUM_SORTS = {
+    "id": AlbumDB.id,
+    "score": AlbumDB.score,
+    "year": AlbumDB.year,
+    "review_date": review_date_sql(AlbumDB.review_date),
+}
+ALBUM_FIELDS = [column.name for column in AlbumDB.__table__.columns]
+SONG_SORTS = {"id": SongDB.id, "score": SongDB.score}
+SONG_FIELDS = [column.name for column in SongDB.__table__.columns]
+
+def sort_value(row, field: str):
+    if field == "review_date":
+        return review_date_key(row.review_date)
+    return getattr(row, field)
+
+def projected_columns(model, columns: list[str], sort_field: str):
+    # the cursor needs id and the sort column even if the client didn't ask for them
+    names = list(dict.fromkeys([*columns, "id", sort_field]))
+    return [getattr(model, name) for name in names]
+
+def page_response(rows, limit: int, sort_field: str, columns: Optional[list[str]], response: Response):
+    """
+    Finish a keyset page: drop the look-ahead row, advertise the next cursor in
+    X-Next-Cursor and, for fields= requests, serialise only the projected columns.
+    """
+    rows, next_cursor = split_page(rows, limit, lambda r: (sort_value(r, sort_field), r.id))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if columns is not None:
+        return JSONResponse([{c: getattr(r, c) for c in columns} for r in rows], headers=headers)
+    response.headers.update(headers)
+    return rows
+
 @app.get("/album/{album_id}", response_model=Album)
-def query_album_by_id(album_id: int, db: Session = Depends(get_db)) -> Album:
-    album = db.query(AlbumDB).filter(AlbumDB.id == album_id).first()
+def query_album_by_id(album_id: int, include: Optional[str] = None, db: Session = Depends(get_db),
+                      snapshot: Optional[Snapshot] = Depends(get_snapshot)) -> Album:
+    relations = parse_include(include)
+    if snapshot is not None:
+        album = snapshot.albums_by_id.get(album_id)
+        album = trim_albums([album], relations)[0] if album else None
+    else:
+        album = album_query(db, relations).filter(AlbumDB.id == album_id).first()
     if not album:
         raise HTTPException(status_code=404, detail="Album not found")
     return album
 
+@app.get("/album/{album_id}/similar", response_model=list[SimilarAlbum])
+def similar_albums(album_id: int, k: int = similar.DEFAULT_K, db: Session = Depends(get_db),
+                   snapshot: Optional[Snapshot] = Depends(get_snapshot)) -> list[SimilarAlbum]:
+    """
+    The k albums closest to this one by genre, artist, year, scores and the
+    spread of its song scores, closest first (k up to 50, default 10).
+    """
+    k = max(1, min(similar.MAX_K, k))
+    neighbours = similar.current_index().similar(album_id, k)
+    if neighbours is None:
+        # may be newer than the index still answering while it rebuilds
+        neighbours = similar.current_index(wait=True).similar(album_id, k)
+    if neighbours is None:
+        raise HTTPException(status_code=404, detail="Album not found")
+    ids = [neighbour_id for neighbour_id, _ in neighbours]
+    if snapshot is not None:
+        albums = snapshot.albums_by_id
+    else:
+        albums = {a.id: a for a in db.query(AlbumDB.id, AlbumDB.title, AlbumDB.artist, AlbumDB.image_url,
+                                            AlbumDB.year, AlbumDB.score, AlbumDB.genre)
+                  .filter(AlbumDB.id.in_(ids))}
+    return [
+        {"id": a.id, "title": a.title, "artist": a.artist, "image_url": a.image_url, "year": a.year,
+         "score": a.score, "genre": a.genre, "distance": distance}
+        for neighbour_id, distance in neighbours
+        if (a := albums.get(neighbour_id)) is not None
+    ]
+
 @app.get("/albums", response_model=list[Album])
-def query_albums(db: Session = Depends(get_db)) -> list[Album]:
-    albums = db.query(AlbumDB).all()
-    return [Album.model_validate(a, from_attributes=True) for a in albums]
+def query_albums(response: Response, include: Optional[str] = None, limit: int = DEFAULT_LIMIT,
+                 cursor: Optional[str] = None, sort: str = "id", fields: Optional[str] = None,
+                 db: Session = Depends(get_db), snapshot: Optional[Snapshot] = Depends(get_snapshot)) -> list[Album]:
+    """
+    List albums one keyset page at a time.
+
+    - limit: page size, capped at 1000 (default: 100)
+    - cursor: the X-Next-Cursor header of the previous page
+    - sort: id, score, year or review_date, prefixed with - for descending (default: id)
+    - fields: comma-separated album columns to return instead of full albums
+    """
+    relations = parse_include(include)
+    try:
+        sort_field, descending = parse_sort(sort, ALBUM_SORTS)
+        columns = parse_fields(fields, ALBUM_FIELDS)
+        limit = clamp_limit(limit)
+        if snapshot is not None:
+            records, keys = snapshot.sorted_by("albums", sort_field)
+            rows = keyset_slice(records, keys, descending, cursor, limit)
+            if columns is None:
+                rows = trim_albums(rows, relations)
+        else:
+            if columns is None:
+                query = album_query(db, relations)
+            else:
+                query = db.query(*projected_columns(AlbumDB, columns, sort_field))
+            rows = keyset_page(query, ALBUM_SORTS[sort_field], AlbumDB.id, descending, cursor, limit).all()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return page_response(rows, limit, sort_field, columns, response)
 
 @app.get("/albums/genre/{genre}", response_model=list[Album])
-def query_albums_by_genre(genre: Genre, db: Session = Depends(get_db)) -> list[Album]:
-    albums = db.query(AlbumDB).filter(AlbumDB.genre == genre.value).all()
+def query_albums_by_genre(genre: Genre, include: Optional[str] = None, db: Session = Depends(get_db),
+                          snapshot: Optional[Snapshot] = Depends(get_snapshot)) -> list[Album]:
+    relations = parse_include(include)
+    if snapshot is not None:
+        return trim_albums(snapshot.albums_by_genre.get(genre.value, ()), relations)
+    albums = album_query(db, relations).filter(AlbumDB.genre == genre.value).all()
     return [Album.model_validate(a, from_attributes=True) for a in albums]
 
 @app.get("/albums/year/{year}", response_model=list[Album])
-def query_albums_by_year(year: int, db: Session = Depends(get_db)) -> list[Album]:
-    albums = db.query(AlbumDB).filter(AlbumDB.year == year).all()
+def query_albums_by_year(year: int, include: Optional[str] = None, db: Session = Depends(get_db),
+                         snapshot: Optional[Snapshot] = Depends(get_snapshot)) -> list[Album]:
+    relations = parse_include(include)
+    if snapshot is not None:
+        return trim_albums(snapshot.albums_by_year.get(year, ()), relations)
+    albums = album_query(db, relations).filter(AlbumDB.year == year).all()
     return [Album.model_validate(a, from_attributes=True) for a in albums]
 
 @app.get("/albums/artist/{artist}", response_model=list[Album])
-def query_albums_by_artist(artist: str, db: Session = Depends(get_db)) -> list[Album]:
-    albums = db.query(AlbumDB).filter(AlbumDB.artist.ilike(f"%{artist}%")).all()
+def query_albums_by_artist(artist: str, include: Optional[str] = None, db: Session = Depends(get_db),
+                           snapshot: Optional[Snapshot] = Depends(get_snapshot)) -> list[Album]:
+    relations = parse_include(include)
+    if snapshot is not None:
+        return trim_albums(snapshot.albums_by_artist(artist), relations)
+    album_ids = search.album_ids_by_artist(db, artist)
+    albums = album_query(db, relations).filter(AlbumDB.id.in_(album_ids)).order_by(AlbumDB.id).all()
     return [Album.model_validate(a, from_attributes=True) for a in albums]
 
+@app.get("/search", response_model=list[SearchHit])
+def search_catalog(q: str, type: Optional[str] = None, limit: int = search.DEFAULT_LIMIT, offset: int = 0,
+                   db: Session = Depends(get_db)) -> list[SearchHit]:
+    """
+    Full-text search over album titles, artists and song names, best matches first.
+
+    Query parameters:
+    - q: text to look for, matched anywhere in a word
+    - type: album or song to search only one kind (optional)
+    - limit: number of hits, capped at 100 (default: 20)
+    - offset: hits to skip for the next page (default: 0)
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="q must not be empty")
+    try:
+        return search.search(db, q.strip(), type, limit, offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+MAX_BATCH = 100
+
+def batch_ids(ids: list[int]) -> list[int]:
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH} ids per batch")
+    return ids
+
+def batch_result(ids: list[int], found: dict) -> dict:
+    return {"found": found, "missing": [i for i in ids if i not in found]}
+
+@app.get("/albums/batch", response_model=AlbumBatch)
+def query_albums_batch(ids: list[int] = Query(), include: Optional[str] = None, db: Session = Depends(get_db),
+                       snapshot: Optional[Snapshot] = Depends(get_snapshot)) -> AlbumBatch:
+    """Look up to 100 albums at once (?ids=1&ids=2), keyed by id, with unknown ids listed under missing."""
+    ids = batch_ids(ids)
+    relations = parse_include(include)
+    if snapshot is not None:
+        albums = trim_albums([snapshot.albums_by_id[i] for i in ids if i in snapshot.albums_by_id], relations)
+    else:
+        albums = album_query(db, relations).filter(AlbumDB.id.in_(ids)).all()
+    return batch_result(ids, {a.id: a for a in albums})
+
+@app.get("/songs/batch", response_model=SongBatch)
+def query_songs_batch(ids: list[int] = Query(), db: Session = Depends(get_db),
+                      snapshot: Optional[Snapshot] = Depends(get_snapshot)) -> SongBatch:
+    """Look up to 100 songs at once (?ids=1&ids=2), keyed by id, with unknown ids listed under missing."""
+    ids = batch_ids(ids)
+    if snapshot is not None:
+        songs = [snapshot.songs_by_id[i] for i in ids if i in snapshot.songs_by_id]
+    else:
+        songs = db.query(SongDB).filter(SongDB.id.in_(ids)).all()
+    return batch_result(ids, {s.id: s for s in songs})
+
+@app.get("/stats/batch", response_model=StatsBatch)
+def query_stats_batch(ids: list[int] = Query(), db: Session = Depends(get_db),
+                      snapshot: Optional[Snapshot] = Depends(get_snapshot)) -> StatsBatch:
+    """Stats for up to 100 albums at once (?ids=1&ids=2), keyed by album id."""
+    ids = batch_ids(ids)
+    if snapshot is not None:
+        found = {i: snapshot.stats_by_album[i][0] for i in ids if snapshot.stats_by_album.get(i)}
+    else:
+        found = {}
+        for stats in db.query(StatsDB).filter(StatsDB.album_id.in_(ids)).order_by(StatsDB.id):
+            found.setdefault(stats.album_id, stats)
+    return batch_result(ids, found)
+
 @app.get("/songs/{song_id}", response_model=Song)
-def query_song_by_id(song_id: int, db: Session = Depends(get_db)) -> Song:
-    song = db.query(SongDB).filter(SongDB.id == song_id).first()
+def query_song_by_id(song_id: int, db: Session = Depends(get_db),
+                     snapshot: Optional[Snapshot] = Depends(get_snapshot)) -> Song:
+    if snapshot is not None:
+        song = snapshot.songs_by_id.get(song_id)
+    else:
+        song = db.query(SongDB).filter(SongDB.id == song_id).first()
     if not song:
         raise HTTPException(status_code=404, detail="Song not found")
     return song
 
 @app.get("/songs/album/{album_id}", response_model=list[Song])
-def query_songs_by_album(album_id: int, db: Session = Depends(get_db)) -> list[Song]:
+def query_songs_by_album(album_id: int, db: Session = Depends(get_db),
+                         snapshot: Optional[Snapshot] = Depends(get_snapshot)) -> list[Song]:
+    if snapshot is not None:
+        return snapshot.songs_by_album.get(album_id, ())
     songs = db.query(SongDB).filter(SongDB.album_id == album_id).all()
     return [Song.model_validate(s, from_attributes=True) for s in songs]
 
 @app.get("/stats/album/{album_id}", response_model=Stats)
-def query_stats_by_album(album_id: int, db: Session = Depends(get_db)) -> Stats:
-    stats = db.query(StatsDB).filter(StatsDB.album_id == album_id).first()
+def query_stats_by_album(album_id: int, db: Session = Depends(get_db),
+                         snapshot: Optional[Snapshot] = Depends(get_snapshot)) -> Stats:
+    if snapshot is not None:
+        stats = next(iter(snapshot.stats_by_album.get(album_id, ())), None)
+    else:
+        stats = db.query(StatsDB).filter(StatsDB.album_id == album_id).first()
     if not stats:
         raise HTTPException(status_code=404, detail="Stats not found")
     return Stats.model_validate(stats, from_attributes=True)
 
 @app.get("/stats/ranking/album/{album_id}")
-def query_album_ranking(album_id: int, db: Session = Depends(get_db)) -> dict:
-    stats = db.query(StatsDB).filter(StatsDB.album_id == album_id).first()
+def query_album_ranking(album_id: int, db: Session = Depends(get_db),
+                        snapshot: Optional[Snapshot] = Depends(get_snapshot)) -> dict:
+    if snapshot is not None:
+        stats = next(iter(snapshot.stats_by_album.get(album_id, ())), None)
+    else:
+        stats = db.query(StatsDB).filter(StatsDB.album_id == album_id).first()
     if not stats:
         raise HTTPException(status_code=404, detail="Stats not found")
     return {
@@ -408,6 +544,273 @@ def query_album_ranking(album_id: int, db: Session = Depends(get_db)) -> dict:
     }
 
 @app.get("/songs", response_model=list[Song])
-def query_all_songs(db: Session = Depends(get_db)) -> list[Song]:
-    songs = db.query(SongDB).all()
-    return [Song.model_validate(s, from_attributes=True) for s in songs]
\ No newline at end of file
+def query_all_songs(response: Response, limit: int = DEFAULT_LIMIT, cursor: Optional[str] = None,
+                    sort: str = "id", fields: Optional[str] = None, db: Session = Depends(get_db),
+                    snapshot: Optional[Snapshot] = Depends(get_snapshot)) -> list[Song]:
+    """
+    List songs one keyset page at a time.
+
+    - limit: page size, capped at 1000 (default: 100)
+    - cursor: the X-Next-Cursor header of the previous page
+    - sort: id or score, prefixed with - for descending (default: id)
+    - fields: comma-separated song columns to return instead of full songs
+    """
+    try:
+        sort_field, descending = parse_sort(sort, SONG_SORTS)
+        columns = parse_fields(fields, SONG_FIELDS)
+        limit = clamp_limit(limit)
+        if snapshot is not None:
+            records, keys = snapshot.sorted_by("songs", sort_field)
+            rows = keyset_slice(records, keys, descending, cursor, limit)
+        else:
+            query = db.query(SongDB) if columns is None else db.query(*projected_columns(SongDB, columns, sort_field))
+            rows = keyset_page(query, SONG_SORTS[sort_field], SongDB.id, descending, cursor, limit).all()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return page_response(rows, limit, sort_field, columns, response)
+
+def export_response(name: str, query, format: str, accept_encoding: Optional[str]) -> export.ExportResponse:
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, expected one of {list(export.FORMATS)}")
+    compress = export.accepts_gzip(accept_encoding)
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{format}"', "Vary": "Accept-Encoding"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return export.ExportResponse(export.stream(query, format, compress), media_type=export.FORMATS[format],
+                                 headers=headers)
+
+@app.get("/export/albums")
+def export_albums(format: str = "ndjson", genre: Optional[Genre] = None, year: Optional[int] = None,
+                  accept_encoding: Optional[str] = Header(None)):
+    """
+    Stream every album (or those matching genre and year) as NDJSON or CSV,
+    gzipped when the client accepts it.
+    """
+    return export_response("albums", export.album_query(genre.value if genre else None, year), format,
+                           accept_encoding)
+
+@app.get("/export/songs")
+def export_songs(format: str = "ndjson", genre: Optional[Genre] = None, year: Optional[int] = None,
+                 album_id: Optional[int] = None, accept_encoding: Optional[str] = Header(None)):
+    """
+    Stream every song (or those matching genre, album year and album_id) as
+    NDJSON or CSV, gzipped when the client accepts it.
+    """
+    return export_response("songs", export.song_query(genre.value if genre else None, year, album_id), format,
+                           accept_encoding)
+
+def group_params(by: str, allowed, sort: str, limit: int) -> tuple[str, bool, int]:
+    if by not in allowed:
+        raise HTTPException(status_code=400, detail=f"Unknown group {by!r}, expected one of {list(allowed)}")
+    try:
+        sort_field, descending = parse_sort(sort, analytics.GROUP_SORTS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return sort_field, descending, clamp_limit(limit)
+
+@app.get("/analytics/albums/groups", response_model=list[AlbumGroup])
+def album_groups(by: str = "genre", genre: Optional[Genre] = None, year: Optional[int] = None, sort: str = "key",
+                 limit: int = DEFAULT_LIMIT) -> list[AlbumGroup]:
+    """
+    Album count and mean/min/max/stddev of score, personal and mean per genre,
+    year or artist, optionally within one genre and/or year.
+
+    - sort: key, count, score (mean score) or spread (score stddev), - for descending
+    """
+    sort_field, descending, limit = group_params(by, analytics.ALBUM_GROUPS, sort, limit)
+    groups = analytics.album_groups(analytics.current_columns(), by, genre.value if genre else None, year,
+                                    sort_field, descending)
+    return groups[:limit]
+
+@app.get("/analytics/songs/groups", response_model=list[SongGroup])
+def song_groups(by: str = "genre", genre: Optional[Genre] = None, year: Optional[int] = None,
+                album_id: Optional[int] = None, sort: str = "key", limit: int = DEFAULT_LIMIT) -> list[SongGroup]:
+    """
+    Song count and score mean/min/max/stddev per genre, album year, artist or
+    album (by=album_id&sort=-spread lists the albums with the widest spread).
+    """
+    sort_field, descending, limit = group_params(by, analytics.SONG_GROUPS, sort, limit)
+    groups = analytics.song_groups(analytics.current_columns(), by, genre.value if genre else None, year, album_id,
+                                   sort_field, descending)
+    return groups[:limit]
+
+@app.get("/analytics/albums/histogram", response_model=Histogram)
+def album_histogram(field: str = "score", bins: int = analytics.DEFAULT_BINS,
+                    low: Optional[float] = Query(None, alias="min"), high: Optional[float] = Query(None, alias="max"),
+                    genre: Optional[Genre] = None, year: Optional[int] = None) -> Histogram:
+    """Histogram of album score, personal or mean in equal-width bins (default: the data's min to max)."""
+    if field not in analytics.ALBUM_METRICS:
+        raise HTTPException(status_code=400, detail=f"Unknown field {field!r}, expected one of {list(analytics.ALBUM_METRICS)}")
+    bins = max(1, min(analytics.MAX_BINS, bins))
+    try:
+        return analytics.album_histogram(analytics.current_columns(), field, bins, low, high,
+                                         genre.value if genre else None, year)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/analytics/songs/histogram", response_model=Histogram)
+def song_histogram(bins: int = analytics.DEFAULT_BINS,
+                   low: Optional[float] = Query(None, alias="min"), high: Optional[float] = Query(None, alias="max"),
+                   genre: Optional[Genre] = None, year: Optional[int] = None,
+                   album_id: Optional[int] = None) -> Histogram:
+    """Histogram of song scores in equal-width bins, optionally within a genre, album year or album."""
+    bins = max(1, min(analytics.MAX_BINS, bins))
+    try:
+        return analytics.song_histogram(analytics.current_columns(), bins, low, high,
+                                        genre.value if genre else None, year, album_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/leaderboard/albums", response_model=list[LeaderboardAlbum])
+def album_leaderboard(year: Optional[int] = None, genre: Optional[Genre] = None, artist: Optional[str] = None,
+                      limit: int = leaderboard.DEFAULT_LIMIT, offset: int = 0) -> list[LeaderboardAlbum]:
+    """
+    Top albums by score, overall or within any mix of year, genre and artist
+    (e.g. ?genre=rap&year=2020 for the best rap albums of 2020).
+    """
+    board = leaderboard.board(current_snapshot(), "albums",
+                              {"year": year, "genre": genre.value if genre else None, "artist": artist})
+    offset = max(0, offset)
+    return [
+        {"rank": rank, **a._asdict()}
+        for rank, a in enumerate(board.top(max(1, min(leaderboard.MAX_LIMIT, limit)), offset), start=offset + 1)
+    ]
+
+@app.get("/leaderboard/albums/percentile", response_model=Percentile)
+def album_percentile(score: float, year: Optional[int] = None, genre: Optional[Genre] = None,
+                     artist: Optional[str] = None) -> Percentile:
+    """Where an album score would place among the albums matching the same filters."""
+    if not math.isfinite(score):
+        raise HTTPException(status_code=400, detail="score must be a finite number")
+    board = leaderboard.board(current_snapshot(), "albums",
+                              {"year": year, "genre": genre.value if genre else None, "artist": artist})
+    return board.percentile(score)
+
+@app.get("/leaderboard/songs", response_model=list[LeaderboardSong])
+def song_leaderboard(year: Optional[int] = None, genre: Optional[Genre] = None, artist: Optional[str] = None,
+                     album_id: Optional[int] = None, limit: int = leaderboard.DEFAULT_LIMIT,
+                     offset: int = 0) -> list[LeaderboardSong]:
+    """Top songs by score, overall or within any mix of album year, genre, artist and album."""
+    snapshot = current_snapshot()
+    board = leaderboard.board(snapshot, "songs", {"year": year, "genre": genre.value if genre else None,
+                                                  "artist": artist, "album_id": album_id})
+    offset = max(0, offset)
+    entries = []
+    for rank, s in enumerate(board.top(max(1, min(leaderboard.MAX_LIMIT, limit)), offset), start=offset + 1):
+        album = snapshot.albums_by_id.get(s.album_id)
+        entries.append({"rank": rank, **s._asdict(),
+                        "artist": album.artist if album else "", "year": album.year if album else None})
+    return entries
+
+@app.get("/leaderboard/songs/percentile", response_model=Percentile)
+def song_percentile(score: float, year: Optional[int] = None, genre: Optional[Genre] = None,
+                    artist: Optional[str] = None, album_id: Optional[int] = None) -> Percentile:
+    """Where a song score would place among the songs matching the same filters."""
+    if not math.isfinite(score):
+        raise HTTPException(status_code=400, detail="score must be a finite number")
+    board = leaderboard.board(current_snapshot(), "songs", {"year": year, "genre": genre.value if genre else None,
+                                                            "artist": artist, "album_id": album_id})
+    return board.percentile(score)
+
+def placement(album: AlbumDB) -> AlbumPlacement:
+    return AlbumPlacement(album.score, album.year, album.genre)
+
+@app.post("/albums", response_model=Album, status_code=201)
+def create_album(album: AlbumCreate, db: Session = Depends(get_write_db)) -> Album:
+    db_album = AlbumDB(**album.model_dump(exclude={"genre"}), genre=album.genre.value)
+    db.add(db_album)
+    db.flush()
+    place_album(db, db_album.id, None, placement(db_album))
+    bump_catalog_version(db)
+    db.commit()
+    expire_version()
+    return album_query(db, set(ALBUM_RELATIONS)).filter(AlbumDB.id == db_album.id).first()
+
+@app.patch("/album/{album_id}", response_model=Album)
+def update_album(album_id: int, changes: AlbumUpdate, db: Session = Depends(get_write_db)) -> Album:
+    db_album = db.query(AlbumDB).filter(AlbumDB.id == album_id).first()
+    if not db_album:
+        raise HTTPException(status_code=404, detail="Album not found")
+    old = placement(db_album)
+    for field, value in changes.model_dump(exclude_unset=True, exclude_none=True).items():
+        setattr(db_album, field, value.value if isinstance(value, Genre) else value)
+    db.flush()
+    new = placement(db_album)
+    if new != old:
+        place_album(db, album_id, old, new)
+    if new.genre != old.genre:
+        db.query(SongDB).filter(SongDB.album_id == album_id).update({"genre": new.genre}, synchronize_session=False)
+    bump_catalog_version(db)
+    db.commit()
+    expire_version()
+    return album_query(db, set(ALBUM_RELATIONS)).filter(AlbumDB.id == album_id).first()
+
+@app.delete("/album/{album_id}", status_code=204)
+def delete_album(album_id: int, db: Session = Depends(get_write_db)):
+    db_album = db.query(AlbumDB).filter(AlbumDB.id == album_id).first()
+    if not db_album:
+        raise HTTPException(status_code=404, detail="Album not found")
+    songs = db.query(SongDB.id, SongDB.song_rank).filter(SongDB.album_id == album_id) \
+        .order_by(SongDB.song_rank.desc()).all()
+    for song_id, song_rank in songs:
+        db.query(SongDB).filter(SongDB.id == song_id).delete(synchronize_session=False)
+        place_song(db, song_id, song_rank, None, album_id, None)
+    old = placement(db_album)
+    db.query(AlbumDB).filter(AlbumDB.id == album_id).delete(synchronize_session=False)
+    place_album(db, album_id, old, None)
+    bump_catalog_version(db)
+    db.commit()
+    expire_version()
+    return Response(status_code=204)
+
+@app.post("/songs", response_model=Song, status_code=201)
+def create_song(song: SongCreate, db: Session = Depends(get_write_db)) -> Song:
+    album = db.query(AlbumDB).filter(AlbumDB.id == song.album_id).first()
+    if not album:
+        raise HTTPException(status_code=404, detail="Album not found")
+    db_song = SongDB(name=song.name, score=song.score, album_id=song.album_id, genre=album.genre)
+    db.add(db_song)
+    db.flush()
+    place_song(db, db_song.id, None, db_song.score, None, db_song.album_id)
+    bump_catalog_version(db)
+    db.commit()
+    expire_version()
+    db.refresh(db_song)
+    return db_song
+
+@app.patch("/songs/{song_id}", response_model=Song)
+def update_song(song_id: int, changes: SongUpdate, db: Session = Depends(get_write_db)) -> Song:
+    db_song = db.query(SongDB).filter(SongDB.id == song_id).first()
+    if not db_song:
+        raise HTTPException(status_code=404, detail="Song not found")
+    old_rank, old_score, old_album_id = db_song.song_rank, db_song.score, db_song.album_id
+    values = changes.model_dump(exclude_unset=True, exclude_none=True)
+    if "album_id" in values:
+        album = db.query(AlbumDB).filter(AlbumDB.id == values["album_id"]).first()
+        if not album:
+            raise HTTPException(status_code=404, detail="Album not found")
+        values["genre"] = album.genre
+    for field, value in values.items():
+        setattr(db_song, field, value)
+    db.flush()
+    if db_song.score != old_score or db_song.album_id != old_album_id:
+        place_song(db, song_id, old_rank, db_song.score, old_album_id, db_song.album_id)
+    bump_catalog_version(db)
+    db.commit()
+    expire_version()
+    db.refresh(db_song)
+    return db_song
+
+@app.delete("/songs/{song_id}", status_code=204)
+def delete_song(song_id: int, db: Session = Depends(get_write_db)):
+    db_song = db.query(SongDB).filter(SongDB.id == song_id).first()
+    if not db_song:
+        raise HTTPException(status_code=404, detail="Song not found")
+    song_rank, album_id = db_song.song_rank, db_song.album_id
+    db.delete(db_song)
+    db.flush()
+    place_song(db, song_id, song_rank, None, album_id, None)
+    bump_catalog_version(db)
+    db.commit()
+    expire_version()
+    return Response(status_code=204)
@@ -0,0 +1,367 @@
+"""
+Request, database and image pipeline metrics in Prometheus text format.
+
+Each worker process keeps its own counters and histograms and flushes them to
+METRICS_DIR/<parent pid>/<pid>.json every METRICS_FLUSH_INTERVAL seconds.
+/metrics merges the files of every worker under the same gunicorn master, so
+any worker answers with totals for all of them. Files of workers that died
+stay in place so counters never go backwards.
+
+With SLOW_REQUEST_MS set, every request slower than that is appended to
+SLOW_REQUEST_LOG as one JSON line with its SQL statements and image stages.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(".cache", "metrics"))
+FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5.0))
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 0))
+SLOW_REQUEST_LOG = os.environ.get("SLOW_REQUEST_LOG", os.path.join(".cache", "slow_requests.ndjson"))
+# statements kept per slow request, slowest first
+SLOW_REQUEST_STATEMENTS = 20
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "http_requests_total": ("counter", "HTTP requests by route, method and status.", None),
+    "http_request_duration_seconds": ("histogram", "HTTP request latency by route.", LATENCY_BUCKETS),
+    "db_statements_total": ("counter", "SQL statements executed, by route.", None),
+    "db_statement_seconds_total": ("counter", "Time spent executing SQL, by route.", None),
+    "db_statements_per_request": ("histogram", "SQL statements issued by one request, by route.", COUNT_BUCKETS),
+    "db_statement_duration_seconds": ("histogram", "SQL statement latency by operation.", LATENCY_BUCKETS),
+    "image_requests_total": ("counter", "Image requests by where the rendition came from.", None),
+    "image_stage_duration_seconds": ("histogram", "Image render time by pipeline stage.", LATENCY_BUCKETS),
+}
+
+class Registry:
+    """Counters and histograms of one process, keyed by (name, sorted label pairs)."""
+
+    def __init__(self):
+        self.counters: dict[tuple, float] = {}
+        # per key: [bucket counts..., +Inf count, sum]
+        self.histograms: dict[tuple, list[float]] = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, labels: dict, value: float = 1.0) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+            self.dirty = True
+        _start_flusher()
+
+    def observe(self, name: str, labels: dict, value: float) -> None:
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [0.0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(buckets)] += 1
+            series[-1] += value
+            self.dirty = True
+        _start_flusher()
+
+    def dump(self) -> dict:
+        with self._lock:
+            self.dirty = False
+            return {
+                "counters": [[name, labels, value] for (name, labels), value in self.counters.items()],
+                "histograms": [[name, labels, series] for (name, labels), series in self.histograms.items()],
+            }
+
+    def merge(self, data: dict) -> None:
+        for name, labels, value in data["counters"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            self.counters[key] = self.counters.get(key, 0.0) + value
+        for name, labels, series in data["histograms"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            mine = self.histograms.get(key)
+            if mine is None or len(mine) != len(series):
+                self.histograms[key] = list(series)
+            else:
+                self.histograms[key] = [a + b for a, b in zip(mine, series)]
+
+registry = Registry()
+
+def _group_dir() -> str:
+    # workers of one gunicorn master share its pid as parent
+    return os.path.join(METRICS_DIR, str(os.getppid()))
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _remove_stale_groups() -> None:
+    """Drop the files left by masters that are no longer running."""
+    try:
+        groups = os.listdir(METRICS_DIR)
+    except FileNotFoundError:
+        return
+    for group in groups:
+        if group.isdigit() and not _alive(int(group)):
+            directory = os.path.join(METRICS_DIR, group)
+            for name in os.listdir(directory):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+
+def flush() -> None:
+    directory = _group_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(registry.dump(), f)
+    os.replace(tmp, path)
+
+_flusher: threading.Thread | None = None
+_flusher_lock = threading.Lock()
+
+def _start_flusher() -> None:
+    global _flusher
+    if _flusher is not None:
+        return
+    with _flusher_lock:
+        if _flusher is not None:
+            return
+
+        def run():
+            _remove_stale_groups()
+            while True:
+                time.sleep(FLUSH_INTERVAL)
+                if registry.dirty:
+                    flush()
+
+        _flusher = threading.Thread(target=run, name="metrics-flush", daemon=True)
+        _flusher.start()
+
+def collect() -> Registry:
+    """This worker's metrics merged with the last flush of every other worker."""
+    flush()
+    merged = Registry()
+    directory = _group_dir()
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                merged.merge(json.load(f))
+        except (FileNotFoundError, ValueError):
+            # a worker replacing its file right now; it will be there next scrape
+            continue
+    return merged
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(pairs, extra: tuple = ()) -> str:
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+def render(reg: Registry) -> str:
+    """Prometheus text exposition format, version 0.0.4."""
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (series_name, labels), value in sorted(reg.counters.items()):
+                if series_name == name:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            continue
+        for (series_name, labels), series in sorted(reg.histograms.items()):
+            if series_name != name:
+                continue
+            cumulative = 0.0
+            for bound, count in zip(buckets, series):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, (('le', _number(bound)),))} {_number(cumulative)}")
+            cumulative += series[len(buckets)]
+            lines.append(f"{name}_bucket{_labels(labels, (('le', '+Inf'),))} {_number(cumulative)}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(series[-1])}")
+            lines.append(f"{name}_count{_labels(labels)} {_number(cumulative)}")
+    return "\n".join(lines) + "\n"
+
+class RequestStats:
+    """What one request did, filled in by the engine events and the image endpoint."""
+
+    __slots__ = ("statements", "db_seconds", "slow_statements", "image")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.slow_statements = [] if SLOW_REQUEST_MS else None
+        self.image = None
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+def current() -> RequestStats | None:
+    return _current.get()
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    # on the execution context, not the connection, so a failed statement leaves nothing behind
+    context._metrics_started = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    registry.observe("db_statement_duration_seconds", {"operation": operation}, elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+        if stats.slow_statements is not None:
+            stats.slow_statements.append((elapsed, statement))
+
+def record_image(source: str, timings: dict | None = None) -> None:
+    """Count where an image came from: not_modified, original, memory, disk or render."""
+    registry.inc("image_requests_total", {"source": source})
+    stats = _current.get()
+    if stats is not None:
+        stats.image = {"source": source, **(timings or {})}
+
+def record_image_stages(timings: dict) -> None:
+    for stage, seconds in timings.items():
+        registry.observe("image_stage_duration_seconds", {"stage": stage}, seconds)
+
+def route_template(scope) -> str:
+    """The path template a request matched, so /album/3 and /album/4 share one series."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # requests answered by middleware (e.g. the response cache) never reach the router
+    app = scope.get("app")
+    for candidate in getattr(getattr(app, "router", None), "routes", ()):
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return candidate.path
+    return "unmatched"
+
+def _log_slow_request(scope, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+    record = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "pid": os.getpid(),
+        "method": scope["method"],
+        "path": scope["path"],
+        "query": scope["query_string"].decode("latin-1"),
+        "route": route,
+        "status": status,
+        "ms": round(seconds * 1000, 3),
+        "db_statements": stats.statements,
+        "db_ms": round(stats.db_seconds * 1000, 3),
+        "slowest_statements": [
+            {"ms": round(elapsed * 1000, 3), "sql": statement}
+            for elapsed, statement in sorted(stats.slow_statements, reverse=True)[:SLOW_REQUEST_STATEMENTS]
+        ],
+        "image": stats.image,
+    }
+    _slow_requests.put(record)
+    _start_slow_log_writer()
+
+# records wait here for the writer thread, so the file append never blocks the event loop
+_slow_requests: queue.Queue = queue.Queue()
+_slow_log_writer: threading.Thread | None = None
+
+def _write_slow_requests() -> None:
+    while True:
+        records = [_slow_requests.get()]
+        while not _slow_requests.empty():
+            records.append(_slow_requests.get())
+        try:
+            directory = os.path.dirname(SLOW_REQUEST_LOG)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # one write per batch of whole lines, so lines from different workers don't interleave
+            with open(SLOW_REQUEST_LOG, "a") as f:
+                f.write("".join(json.dumps(record) + "\n" for record in records))
+        finally:
+            for _ in records:
+                _slow_requests.task_done()
+
+def _start_slow_log_writer() -> None:
+    global _slow_log_writer
+    if _slow_log_writer is not None:
+        return
+    with _flusher_lock:
+        if _slow_log_writer is not None:
+            return
+        _slow_log_writer = threading.Thread(target=_write_slow_requests, name="slow-request-log", daemon=True)
+        _slow_log_writer.start()
+
+def flush_slow_requests() -> None:
+    """Wait until every slow request logged so far is in SLOW_REQUEST_LOG."""
+    _slow_requests.join()
+
+class MetricsMiddleware:
+    """
+    Time every HTTP request and attribute its SQL statements to its route.
+
+    Add it last so it wraps everything else, including cached responses.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            route = route_template(scope)
+            registry.inc("http_requests_total", {"route": route, "method": scope["method"], "status": str(status)})
+            registry.observe("http_request_duration_seconds", {"route": route}, elapsed)
+            registry.observe("db_statements_per_request", {"route": route}, stats.statements)
+            if stats.statements:
+                registry.inc("db_statements_total", {"route": route}, stats.statements)
+                registry.inc("db_statement_seconds_total", {"route": route}, stats.db_seconds)
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                _log_slow_request(scope, route, status, elapsed, stats)
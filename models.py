@@ -0,0 +1,317 @@
+import os
+from enum import Enum
+from typing import Optional
+from pydantic import BaseModel, FiniteFloat
+from sqlalchemy import create_engine, event, make_url, Column, Integer, String, Float, ForeignKey, Index
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker, relationship
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./albums.db")
+READ_POOL_SIZE = int(os.environ.get("DATABASE_READ_POOL_SIZE", 8))
+
+# Applied to every SQLite connection. WAL lets readers carry on while a writer
+# commits; journal_mode is persistent, so only the writer engine sets it.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    # negative values are KiB rather than pages
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", -64 * 1024)),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+}
+
+def create_db_engine(url: str = DATABASE_URL, read_only: bool = False, pragmas: dict = SQLITE_PRAGMAS,
+                     pool_size: int = 5):
+    """
+    Create an engine for url. SQLite connections get pragmas on connect, and
+    read_only engines are additionally locked to query_only.
+    """
+    if make_url(url).get_backend_name() != "sqlite":
+        return create_engine(url, pool_size=pool_size)
+
+    engine = create_engine(url, connect_args={"check_same_thread": False}, pool_size=pool_size)
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            if read_only and name == "journal_mode":
+                continue
+            cursor.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+    return engine
+
+engine = create_db_engine()
+read_engine = create_db_engine(read_only=True, pool_size=READ_POOL_SIZE)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+Base = declarative_base()
+
+class Genre(str, Enum):
+    rock = "rock"
+    pop = "pop"
+    jazz = "jazz"
+    classical = "classical"
+    rap = "rap"
+    rnb = "rnb"
+    musical = "musical"
+    edm = "edm"
+    psychedelic = "psychedelic"
+    lofi = "lofi"
+    soul = "soul"
+    hip_hop = "hip_hop"
+    other = "other"
+
+class CatalogVersionDB(Base):
+    __tablename__ = "catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, default=0)
+
+class ImportDB(Base):
+    """Checksum of the last file imported per kind and path, so unchanged files are skipped."""
+    __tablename__ = "imports"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String)
+    path = Column(String)
+    checksum = Column(String)
+    rows = Column(Integer, default=0)
+    imported_at = Column(String)
+
+    __table_args__ = (
+        Index("ix_imports_kind_path", "kind", "path", unique=True),
+    )
+
+class StatsDB(Base):
+    __tablename__ = "stats"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    album_id = Column(Integer, ForeignKey("albums.id"))
+    album_rank = Column(Integer)
+    highest_song_rank = Column(Integer)
+    rank_in_year = Column(Integer)
+    rank_in_genre = Column(Integer)
+    album = relationship("AlbumDB", back_populates="stats")
+
+    __table_args__ = (Index("ix_stats_album_id", "album_id"),)
+
+class SongStatsDB(Base):
+    __tablename__ = "song_stats"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    song_id = Column(Integer, ForeignKey("songs.id"))
+    song_rank = Column(Integer)
+    album_rank = Column(Integer)
+
+class SongDB(Base):
+    __tablename__ = "songs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, index=True)
+    score = Column(Float)
+    album_id = Column(Integer, ForeignKey("albums.id"))
+    song_rank = Column(Integer, ForeignKey("song_stats.song_rank"))
+    genre = Column(String)
+    album = relationship("AlbumDB", back_populates="songs")
+
+    __table_args__ = (
+        Index("ix_songs_score_id", "score", "id"),
+        Index("ix_songs_album_id", "album_id"),
+    )
+
+class AlbumDB(Base):
+    __tablename__ = "albums"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String, index=True)
+    artist = Column(String)
+    image_url = Column(String, default="")
+    year = Column(Integer)
+    score = Column(Float)
+    personal = Column(Float, default=0.0)
+    mean = Column(Float, default=0.0)
+    leng = Column(String, default=0)
+    rec = Column(String, default="")
+    review_date = Column(String, default="")
+    stats = relationship("StatsDB", back_populates="album")
+    genre = Column(String)
+    songs = relationship("SongDB", back_populates="album")
+
+    __table_args__ = (
+        Index("ix_albums_score_id", "score", "id"),
+        Index("ix_albums_year_id", "year", "id"),
+    )
+
+class Stats(BaseModel):
+    album_rank: int
+    highest_song_rank: int
+    rank_in_year: int
+    rank_in_genre: int
+
+    class Config:
+        orm_mode = True
+
+class Song(BaseModel):
+    id: int
+    name: str
+    score: float
+    album_id: int
+    song_rank: int
+    genre: Genre
+    
+    class Config:
+        from_attributes = True
+
+class Album(BaseModel):
+    id: int
+    title: str
+    artist: str
+    image_url: str = ""
+    year: int
+    score: float
+    personal: float = 0.0
+    mean: float = 0.0
+    leng: str = "0"
+    rec: str = ""
+    review_date: str = ""
+    stats: list[Stats] = []
+    genre: Genre
+    songs: list[Song] = []
+    
+    class Config:
+        from_attributes = True
+
+class AlbumCreate(BaseModel):
+    title: str
+    artist: str
+    image_url: str = ""
+    year: int
+    score: FiniteFloat
+    personal: FiniteFloat = 0.0
+    mean: FiniteFloat = 0.0
+    leng: str = "0"
+    rec: str = ""
+    review_date: str = ""
+    genre: Genre
+
+class AlbumUpdate(BaseModel):
+    title: Optional[str] = None
+    artist: Optional[str] = None
+    image_url: Optional[str] = None
+    year: Optional[int] = None
+    score: Optional[FiniteFloat] = None
+    personal: Optional[FiniteFloat] = None
+    mean: Optional[FiniteFloat] = None
+    leng: Optional[str] = None
+    rec: Optional[str] = None
+    review_date: Optional[str] = None
+    genre: Optional[Genre] = None
+
+class SongCreate(BaseModel):
+    name: str
+    score: FiniteFloat
+    album_id: int
+
+class SongUpdate(BaseModel):
+    name: Optional[str] = None
+    score: Optional[FiniteFloat] = None
+    album_id: Optional[int] = None
+
+class SearchHit(BaseModel):
+    type: str
+    id: int
+    title: str
+    artist: str
+    album_id: int
+    rank: float
+
+class LeaderboardAlbum(BaseModel):
+    rank: int
+    id: int
+    title: str
+    artist: str
+    image_url: str = ""
+    year: int
+    genre: Genre
+    score: float
+
+class LeaderboardSong(BaseModel):
+    rank: int
+    id: int
+    name: str
+    score: float
+    album_id: int
+    genre: Genre
+    artist: str = ""
+    year: Optional[int] = None
+
+class Percentile(BaseModel):
+    score: float
+    count: int
+    rank: int
+    percentile: float
+
+class AlbumBatch(BaseModel):
+    found: dict[int, Album]
+    missing: list[int]
+
+class SongBatch(BaseModel):
+    found: dict[int, Song]
+    missing: list[int]
+
+class StatsBatch(BaseModel):
+    found: dict[int, Stats]
+    missing: list[int]
+
+class MetricSummary(BaseModel):
+    mean: float
+    min: float
+    max: float
+    stddev: float
+
+class AlbumGroup(BaseModel):
+    key: int | str
+    count: int
+    score: MetricSummary
+    personal: MetricSummary
+    mean: MetricSummary
+
+class SongGroup(BaseModel):
+    key: int | str
+    count: int
+    score: MetricSummary
+
+class Histogram(BaseModel):
+    field: str
+    count: int
+    min: float
+    max: float
+    edges: list[float]
+    counts: list[int]
+
+class SimilarAlbum(BaseModel):
+    id: int
+    title: str
+    artist: str
+    image_url: str
+    year: int
+    score: float
+    genre: str
+    distance: float
+
+class SpriteTile(BaseModel):
+    x: int
+    y: int
+    width: int
+    height: int
+
+class SpriteAtlas(BaseModel):
+    url: Optional[str]
+    width: int
+    height: int
+    tiles: dict[int, SpriteTile]
+    missing: list[int]
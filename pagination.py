@@ -0,0 +1,115 @@
+import base64
+import json
+import re
+from bisect import bisect_left, bisect_right
+
+from sqlalchemy import Integer, and_, case, cast, func, not_, or_
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+def encode_cursor(value, last_id: int) -> str:
+    raw = json.dumps([value, last_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    """Inverse of encode_cursor. Raises ValueError for anything it didn't produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, last_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(last_id, int) or not isinstance(value, (int, float)):
+        raise ValueError("Invalid cursor")
+    return value, last_id
+
+def parse_sort(sort: str, allowed) -> tuple[str, bool]:
+    """Split "score" / "-score" into (field, descending), checking it against allowed."""
+    descending = sort.startswith("-")
+    field = sort.lstrip("-")
+    if field not in allowed:
+        raise ValueError(f"Unknown sort {sort!r}, expected one of {sorted(allowed)} (prefix with - for descending)")
+    return field, descending
+
+def parse_fields(fields: str | None, allowed) -> list[str] | None:
+    if fields is None:
+        return None
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in wanted if f not in allowed]
+    if unknown or not wanted:
+        raise ValueError(f"Unknown fields {unknown}, expected some of {list(allowed)}")
+    return wanted
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(MAX_LIMIT, limit))
+
+REVIEW_DATE = re.compile(r"[0-9]+/[0-9]+/[0-9]+")
+
+def review_date_key(review_date: str | None) -> int:
+    """
+    Turn review dates like "10/17/2022" or "10-09-2022" into a sortable 20221017.
+    Anything else (empty, missing or malformed) is 0, exactly as review_date_sql has it.
+    """
+    date = (review_date or "").replace("-", "/")
+    if not REVIEW_DATE.fullmatch(date):
+        return 0
+    month, day, year = map(int, date.split("/"))
+    return year * 10000 + month * 100 + day
+
+def review_date_sql(column):
+    """SQL equivalent of review_date_key for ordering and keyset filters."""
+    date = func.replace(func.coalesce(column, ""), "-", "/")
+    first = func.instr(date, "/")
+    rest = func.substr(date, first + 1)
+    second = func.instr(rest, "/")
+    month = cast(func.substr(date, 1, first - 1), Integer)
+    day = cast(func.substr(rest, 1, second - 1), Integer)
+    year = cast(func.substr(rest, second + 1), Integer)
+    # the same shape REVIEW_DATE accepts: three non-empty runs of digits split by two slashes
+    well_formed = and_(
+        date.op("GLOB")("?*/?*/?*"),
+        not_(date.op("GLOB")("*[^0-9/]*")),
+        not_(date.op("GLOB")("*/*/*/*")),
+        not_(date.op("GLOB")("*//*")),
+        not_(date.op("GLOB")("/*")),
+        not_(date.op("GLOB")("*/")),
+    )
+    return case((well_formed, year * 10000 + month * 100 + day), else_=0)
+
+def keyset_page(query, column, id_column, descending: bool, cursor: str | None, limit: int):
+    """
+    Apply ordering, the keyset filter and the limit to a query.
+
+    Ties are broken by id in the same direction as the sort so the
+    (column, id) pair is always strictly monotonic.
+    """
+    if cursor is not None:
+        value, last_id = decode_cursor(cursor)
+        if descending:
+            query = query.filter(or_(column < value, and_(column == value, id_column < last_id)))
+        else:
+            query = query.filter(or_(column > value, and_(column == value, id_column > last_id)))
+    if descending:
+        query = query.order_by(column.desc(), id_column.desc())
+    else:
+        query = query.order_by(column.asc(), id_column.asc())
+    # one extra row tells us whether there is a next page
+    return query.limit(limit + 1)
+
+def keyset_slice(records, keys, descending: bool, cursor: str | None, limit: int):
+    """
+    In-memory keyset page over records already sorted ascending by keys,
+    where keys[i] is the (value, id) pair for records[i].
+    """
+    if descending:
+        end = len(keys) if cursor is None else bisect_left(keys, tuple(decode_cursor(cursor)))
+        return list(reversed(records[max(0, end - limit - 1):end]))
+    start = 0 if cursor is None else bisect_right(keys, tuple(decode_cursor(cursor)))
+    return list(records[start:start + limit + 1])
+
+def split_page(rows, limit: int, cursor_of):
+    """Trim the look-ahead row and return (page, next_cursor)."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*cursor_of(rows[-1]))
@@ -0,0 +1,125 @@
+from typing import NamedTuple
+
+from sqlalchemy import select, update, delete, insert, func, or_, and_
+
+from models import AlbumDB, SongDB, StatsDB
+
+# Ranks follow the same order as bootstrap.compute_ranks: score descending,
+# ties broken by ascending id, numbered densely from 1. A write only shifts the
+# ranks between a row's old and new position instead of renumbering everything.
+
+class AlbumPlacement(NamedTuple):
+    score: float
+    year: int
+    genre: str
+
+def _position(db, model, score: float, row_id: int, *scope) -> int:
+    """1-based rank a row with this score and id takes among the other rows in scope."""
+    ahead = db.execute(
+        select(func.count()).select_from(model).where(
+            model.id != row_id,
+            or_(model.score > score, and_(model.score == score, model.id < row_id)),
+            *scope,
+        )
+    ).scalar()
+    return ahead + 1
+
+def _apply(db, column, lo: int, hi: int | None, delta: int, *conditions) -> None:
+    conditions = [column >= lo, *conditions]
+    if hi is not None:
+        conditions.append(column <= hi)
+    db.execute(
+        update(column.class_).where(*conditions).values({column.key: column + delta})
+        .execution_options(synchronize_session=False)
+    )
+
+def _shift(db, column, old: int | None, new: int | None, *scope):
+    """
+    Make room for a row moving from rank old to rank new, where None means the
+    row is entering or leaving the ordering. Returns the shifted (lo, hi, delta)
+    range, hi None meaning unbounded, or None if nothing moved.
+    """
+    if old is None and new is None:
+        return None
+    if old is None:
+        lo, hi, delta = new, None, 1
+    elif new is None:
+        lo, hi, delta = old + 1, None, -1
+    elif new < old:
+        lo, hi, delta = new, old - 1, 1
+    elif new > old:
+        lo, hi, delta = old + 1, new, -1
+    else:
+        return None
+    _apply(db, column, lo, hi, delta, *scope)
+    return lo, hi, delta
+
+def _in_group(column, value):
+    return StatsDB.album_id.in_(select(AlbumDB.id).where(column == value))
+
+def _best_song_rank(album_id: int):
+    return func.coalesce(select(func.min(SongDB.song_rank)).where(SongDB.album_id == album_id).scalar_subquery(), 0)
+
+def place_album(db, album_id: int, old: AlbumPlacement | None, new: AlbumPlacement | None) -> None:
+    """
+    Move an album's stats from its old placement to its new one, where None
+    means the album is being created or deleted. Call after the albums row has
+    been written and before committing.
+    """
+    stats = db.execute(select(StatsDB).where(StatsDB.album_id == album_id)).scalars().first()
+    others = StatsDB.album_id != album_id
+    if stats is None:
+        old = None
+
+    ranks = {}
+    new_rank = _position(db, AlbumDB, new.score, album_id) if new else None
+    _shift(db, StatsDB.album_rank, stats.album_rank if old else None, new_rank, others)
+    ranks["album_rank"] = new_rank
+
+    for group, rank_column in ((AlbumDB.year, StatsDB.rank_in_year), (AlbumDB.genre, StatsDB.rank_in_genre)):
+        old_group = getattr(old, group.key) if old else None
+        new_group = getattr(new, group.key) if new else None
+        old_rank = getattr(stats, rank_column.key) if old else None
+        new_rank = _position(db, AlbumDB, new.score, album_id, group == new_group) if new else None
+        if old and new and old_group == new_group:
+            _shift(db, rank_column, old_rank, new_rank, others, _in_group(group, new_group))
+        else:
+            if old:
+                _shift(db, rank_column, old_rank, None, others, _in_group(group, old_group))
+            if new:
+                _shift(db, rank_column, None, new_rank, others, _in_group(group, new_group))
+        ranks[rank_column.key] = new_rank
+
+    if new is None:
+        db.execute(delete(StatsDB).where(StatsDB.album_id == album_id).execution_options(synchronize_session=False))
+    elif stats is None:
+        db.execute(insert(StatsDB).values(album_id=album_id, highest_song_rank=_best_song_rank(album_id), **ranks))
+    else:
+        db.execute(
+            update(StatsDB).where(StatsDB.album_id == album_id).values(**ranks)
+            .execution_options(synchronize_session=False)
+        )
+
+def place_song(db, song_id: int, old_rank: int | None, new_score: float | None,
+               old_album_id: int | None, new_album_id: int | None) -> None:
+    """
+    Move a song from old_rank to the rank its new score earns (new_score None
+    when the song was deleted), then fix highest_song_rank for the albums whose
+    best song shifted. Call after the songs row has been written.
+    """
+    new_rank = _position(db, SongDB, new_score, song_id) if new_score is not None else None
+    shifted = _shift(db, SongDB.song_rank, old_rank, new_rank, SongDB.id != song_id)
+    touched = {a for a in (old_album_id, new_album_id) if a is not None}
+    if shifted:
+        # shifting a contiguous run of song ranks shifts any album whose best song lies in it by the same amount
+        _apply(db, StatsDB.highest_song_rank, *shifted, StatsDB.album_id.not_in(touched))
+    if new_rank is not None:
+        db.execute(
+            update(SongDB).where(SongDB.id == song_id).values(song_rank=new_rank)
+            .execution_options(synchronize_session=False)
+        )
+    for album_id in touched:
+        db.execute(
+            update(StatsDB).where(StatsDB.album_id == album_id).values(highest_song_rank=_best_song_rank(album_id))
+            .execution_options(synchronize_session=False)
+        )
@@ -0,0 +1,163 @@
+import gzip
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+
+import catalog
+from http_cache import etag_matches
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_ENTRIES", 512))
+CACHE_CONTROL = "public, no-cache"
+# fast settings: entries are recompressed after every catalog change, and
+# brotli's default quality 11 costs far more than it saves here
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# response headers worth replaying from a cached entry
+KEPT_HEADERS = ("content-type", "x-next-cursor")
+
+CACHED_ROUTES = [
+    re.compile(r"^/albums$"),
+    re.compile(r"^/albums/genre/[^/]+$"),
+    re.compile(r"^/albums/year/[^/]+$"),
+    re.compile(r"^/songs/album/[^/]+$"),
+]
+
+class Entry:
+    """
+    One encoded response body plus its compressed variants.
+
+    Compression happens in the constructor, so build entries off the event
+    loop (the middleware uses run_in_threadpool).
+    """
+
+    __slots__ = ("version", "etag", "headers", "identity", "_gzip", "_br")
+
+    def __init__(self, version: int, headers: list[tuple[bytes, bytes]], body: bytes):
+        self.version = version
+        self.headers = headers
+        self.identity = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self._gzip = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        self._br = brotli.compress(body, quality=BROTLI_QUALITY) if brotli is not None else None
+
+    def body(self, encoding: str) -> bytes:
+        if encoding == "br":
+            return self._br
+        if encoding == "gzip":
+            return self._gzip
+        return self.identity
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return "identity"
+
+class ResponseCacheMiddleware:
+    """
+    Serve the hot list endpoints from fully encoded bodies.
+
+    Successful GET responses for CACHED_ROUTES are stored per path and query
+    string, with an ETag and gzip/brotli variants. Every entry belongs to one
+    catalog version and the whole cache is dropped when the version moves, so
+    a hit never touches the database, the ORM or the JSON encoder. Misses are
+    compressed in a worker thread, never on the event loop.
+    """
+
+    def __init__(self, app, max_entries: int = MAX_ENTRIES):
+        self.app = app
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, bytes], Entry] = OrderedDict()
+        self._version: int | None = None
+        self._lock = threading.Lock()
+
+    def _get(self, key, version: int) -> Entry | None:
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+                return None
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, entry: Entry) -> None:
+        with self._lock:
+            if entry.version != self._version:
+                return
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" \
+                or not any(route.match(scope["path"]) for route in CACHED_ROUTES):
+            await self.app(scope, receive, send)
+            return
+
+        version = catalog.cached_version()
+        if version is None:
+            version = await run_in_threadpool(catalog.current_version)
+        key = (scope["path"], scope["query_string"])
+        entry = self._get(key, version)
+
+        if entry is None:
+            start = {}
+            chunks = []
+
+            async def capture(message):
+                if message["type"] == "http.response.start":
+                    start.update(message)
+                else:
+                    chunks.append(message.get("body", b""))
+
+            await self.app(scope, receive, capture)
+            status = start.get("status")
+            body = b"".join(chunks)
+            if status != 200:
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+            kept = [(k, v) for k, v in start.get("headers", []) if k.decode().lower() in KEPT_HEADERS]
+            entry = await run_in_threadpool(Entry, version, kept, body)
+            self._put(key, entry)
+
+        await self._respond(scope, send, entry)
+
+    async def _respond(self, scope, send, entry: Entry):
+        request_headers = Headers(scope=scope)
+        headers = [
+            (b"etag", entry.etag.encode()),
+            (b"cache-control", CACHE_CONTROL.encode()),
+            (b"vary", b"Accept-Encoding"),
+        ]
+        if etag_matches(request_headers.get("if-none-match"), entry.etag):
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        encoding = negotiate_encoding(request_headers.get("accept-encoding", ""))
+        body = entry.body(encoding)
+        headers += entry.headers
+        headers.append((b"content-length", str(len(body)).encode()))
+        if encoding != "identity":
+            headers.append((b"content-encoding", encoding.encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,103 @@
+from sqlalchemy import text
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# the trigram tokenizer can only use its index for terms of at least this length
+MIN_INDEXED_LENGTH = 3
+
+# External-content FTS5 tables over albums and songs, kept in sync by triggers
+# so that every writer (bootstrap, importers, endpoints) updates them for free.
+SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS albums_fts USING fts5(
+        title, artist, content='albums', content_rowid='id', tokenize='trigram')""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts USING fts5(
+        name, content='songs', content_rowid='id', tokenize='trigram')""",
+    """CREATE TRIGGER IF NOT EXISTS albums_fts_insert AFTER INSERT ON albums BEGIN
+        INSERT INTO albums_fts(rowid, title, artist) VALUES (new.id, new.title, new.artist);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS albums_fts_delete AFTER DELETE ON albums BEGIN
+        INSERT INTO albums_fts(albums_fts, rowid, title, artist) VALUES ('delete', old.id, old.title, old.artist);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS albums_fts_update AFTER UPDATE OF title, artist ON albums BEGIN
+        INSERT INTO albums_fts(albums_fts, rowid, title, artist) VALUES ('delete', old.id, old.title, old.artist);
+        INSERT INTO albums_fts(rowid, title, artist) VALUES (new.id, new.title, new.artist);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS songs_fts_insert AFTER INSERT ON songs BEGIN
+        INSERT INTO songs_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS songs_fts_delete AFTER DELETE ON songs BEGIN
+        INSERT INTO songs_fts(songs_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS songs_fts_update AFTER UPDATE OF name ON songs BEGIN
+        INSERT INTO songs_fts(songs_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO songs_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+]
+
+def ensure_search_index(conn) -> bool:
+    """Create the search tables and triggers if missing. Returns True if the index had to be built."""
+    exists = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'albums_fts'"
+    ).first() is not None
+    for statement in SEARCH_DDL:
+        conn.exec_driver_sql(statement)
+    if not exists:
+        # index the rows that were there before the triggers
+        conn.exec_driver_sql("INSERT INTO albums_fts(albums_fts) VALUES ('rebuild')")
+        conn.exec_driver_sql("INSERT INTO songs_fts(songs_fts) VALUES ('rebuild')")
+    return not exists
+
+def _phrase(q: str) -> str:
+    # quote the whole input as one FTS5 phrase so user text is never parsed as query syntax
+    return '"' + q.replace('"', '""') + '"'
+
+def _like(q: str) -> str:
+    return "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def _album_hits(q: str, column: str | None = None) -> str:
+    if len(q) >= MIN_INDEXED_LENGTH:
+        match = "albums_fts MATCH :match" if column is None else f"albums_fts.{column} MATCH :match"
+        return f"""
+            SELECT 'album' AS type, a.id AS id, a.title AS title, a.artist AS artist, a.id AS album_id,
+                   bm25(albums_fts) AS rank
+            FROM albums_fts JOIN albums a ON a.id = albums_fts.rowid
+            WHERE {match}"""
+    columns = ["title", "artist"] if column is None else [column]
+    where = " OR ".join(f"a.{c} LIKE :like ESCAPE '\\'" for c in columns)
+    return f"""
+        SELECT 'album' AS type, a.id AS id, a.title AS title, a.artist AS artist, a.id AS album_id, 0.0 AS rank
+        FROM albums a WHERE {where}"""
+
+def _song_hits(q: str) -> str:
+    if len(q) >= MIN_INDEXED_LENGTH:
+        source, where, rank = "songs_fts JOIN songs s ON s.id = songs_fts.rowid", "songs_fts MATCH :match", "bm25(songs_fts)"
+    else:
+        source, where, rank = "songs s", "s.name LIKE :like ESCAPE '\\'", "0.0"
+    return f"""
+        SELECT 'song' AS type, s.id AS id, s.name AS title, COALESCE(a.artist, '') AS artist, s.album_id AS album_id,
+               {rank} AS rank
+        FROM {source} LEFT JOIN albums a ON a.id = s.album_id
+        WHERE {where}"""
+
+def search(db, q: str, type: str | None = None, limit: int = DEFAULT_LIMIT, offset: int = 0) -> list:
+    """
+    Ranked hits over album titles, artists and song names.
+
+    Terms of three or more characters go through the trigram index and are
+    ordered by bm25; shorter type-ahead prefixes fall back to a LIKE scan.
+    """
+    parts = []
+    if type in (None, "album"):
+        parts.append(_album_hits(q))
+    if type in (None, "song"):
+        parts.append(_song_hits(q))
+    if not parts:
+        raise ValueError("type must be album or song")
+    sql = " UNION ALL ".join(parts) + " ORDER BY rank, type, id LIMIT :limit OFFSET :offset"
+    params = {"match": _phrase(q), "like": _like(q), "limit": max(1, min(MAX_LIMIT, limit)), "offset": max(0, offset)}
+    return db.execute(text(sql), params).all()
+
+def album_ids_by_artist(db, artist: str) -> list[int]:
+    """Ids of albums whose artist contains the given text, using the index where possible."""
+    sql = _album_hits(artist, column="artist") + " ORDER BY a.id"
+    return [row.id for row in db.execute(text(sql), {"match": _phrase(artist), "like": _like(artist)})]
@@ -0,0 +1,195 @@
+"""
+Nearest-neighbour album recommendations.
+
+Every album gets a small feature vector: year, score, personal and mean, plus
+the mean and spread of its song scores. Albums are compared by squared
+euclidean distance over those features. A different genre adds
+GENRE_PENALTY and a different artist adds ARTIST_PENALTY.
+
+The index keeps one k-d tree per genre and a list of albums per artist. It is
+built from the analytics columns, so it is rebuilt exactly when they are.
+Because the penalties are constant within a genre tree, a query visits its
+own genre first and only opens another genre's tree while that tree could
+still beat the current k-th best. The MAX_K nearest of each album are
+computed up front for catalogs of up to PRECOMPUTE_ALBUMS albums, and on
+first request (then memoised) for bigger ones; smaller k are slices of them.
+"""
+import heapq
+import math
+import os
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+import analytics
+from catalog import current_version
+
+# units per feature, so 10 years ~ 10 album score points ~ 1 personal point
+FEATURE_SCALES = {"year": 10.0, "score": 10.0, "personal": 1.0, "mean": 1.0, "song_mean": 1.0, "song_spread": 1.0}
+GENRE_PENALTY = 4.0
+ARTIST_PENALTY = 1.0
+DEFAULT_K = 10
+MAX_K = 50
+LEAF_SIZE = 8
+# catalogs up to this many albums get every answer computed when the index is built
+PRECOMPUTE_ALBUMS = int(os.environ.get("SIMILAR_PRECOMPUTE_ALBUMS", 2000))
+
+def features(cols: analytics.Columns) -> list[tuple[float, ...]]:
+    """One feature vector per album position in cols."""
+    song_scores = defaultdict(list)
+    for album, score in zip(cols.song_album, cols.song_score):
+        if album >= 0:
+            song_scores[album].append(score)
+    vectors = []
+    for i in range(len(cols.album_id)):
+        scores = song_scores.get(i)
+        if scores:
+            song_mean = math.fsum(scores) / len(scores)
+            song_spread = math.sqrt(math.fsum((s - song_mean) ** 2 for s in scores) / len(scores))
+        else:
+            # no songs yet: assume they average what the album does, with no spread
+            song_mean, song_spread = cols.album_mean[i], 0.0
+        vectors.append((
+            cols.album_year[i] / FEATURE_SCALES["year"],
+            cols.album_score[i] / FEATURE_SCALES["score"],
+            cols.album_personal[i] / FEATURE_SCALES["personal"],
+            cols.album_mean[i] / FEATURE_SCALES["mean"],
+            song_mean / FEATURE_SCALES["song_mean"],
+            song_spread / FEATURE_SCALES["song_spread"],
+        ))
+    return vectors
+
+def _build(points: list[int], vectors: list[tuple], depth: int = 0):
+    """k-d tree node: a list of positions at the leaves, (axis, split, left, right) above them."""
+    if len(points) <= LEAF_SIZE:
+        return points
+    axis = depth % len(vectors[points[0]])
+    points.sort(key=lambda p: vectors[p][axis])
+    middle = len(points) // 2
+    return (axis, vectors[points[middle]][axis],
+            _build(points[:middle], vectors, depth + 1), _build(points[middle:], vectors, depth + 1))
+
+def _distance(a: tuple, b: tuple) -> float:
+    return sum((x - y) ** 2 for x, y in zip(a, b))
+
+class Index:
+    __slots__ = ("columns", "vectors", "trees", "by_artist", "_answers", "_lock")
+
+    def __init__(self, cols: analytics.Columns):
+        self.columns = cols
+        self.vectors = features(cols)
+        by_genre = defaultdict(list)
+        self.by_artist = defaultdict(list)
+        for i in range(len(cols.album_id)):
+            by_genre[cols.album_genre[i]].append(i)
+            self.by_artist[cols.album_artist[i]].append(i)
+        self.trees = {genre: _build(points, self.vectors) for genre, points in by_genre.items()}
+        self._answers = {}
+        self._lock = threading.Lock()
+
+    def _search(self, node, target: tuple, penalty: float, skip: int, artist: int, best: list, k: int) -> None:
+        """Push (-distance, position) of the k closest albums under node onto the max-heap best."""
+        if isinstance(node, list):
+            for p in node:
+                if p == skip or self.columns.album_artist[p] == artist:
+                    # same-artist albums are scored separately, without the artist penalty
+                    continue
+                d = _distance(self.vectors[p], target) + penalty
+                if len(best) < k:
+                    heapq.heappush(best, (-d, p))
+                elif d < -best[0][0]:
+                    heapq.heapreplace(best, (-d, p))
+            return
+        axis, split, left, right = node
+        gap = target[axis] - split
+        near, far = (left, right) if gap < 0 else (right, left)
+        self._search(near, target, penalty, skip, artist, best, k)
+        if len(best) < k or penalty + gap * gap < -best[0][0]:
+            self._search(far, target, penalty, skip, artist, best, k)
+
+    def similar(self, album_id: int, k: int = DEFAULT_K) -> list[tuple[int, float]] | None:
+        """The k nearest albums as (album id, distance), closest first; None for an unknown album."""
+        cols = self.columns
+        # album ids are stored in ascending order
+        position = bisect_left(cols.album_id, album_id)
+        if position == len(cols.album_id) or cols.album_id[position] != album_id:
+            return None
+        cached = self._answers.get(position)
+        if cached is None:
+            cached = self._nearest(position, MAX_K)
+            with self._lock:
+                self._answers[position] = cached
+        return cached[:k]
+
+    def precompute(self) -> None:
+        answers = {position: self._nearest(position, MAX_K) for position in range(len(self.vectors))}
+        with self._lock:
+            self._answers = answers
+
+    def _nearest(self, position: int, k: int) -> list[tuple[int, float]]:
+        cols = self.columns
+        target = self.vectors[position]
+        genre, artist = cols.album_genre[position], cols.album_artist[position]
+        best = []
+        for p in self.by_artist[artist]:
+            if p != position:
+                d = _distance(self.vectors[p], target) + (GENRE_PENALTY if cols.album_genre[p] != genre else 0.0)
+                heapq.heappush(best, (-d, p))
+                if len(best) > k:
+                    heapq.heappop(best)
+        self._search(self.trees[genre], target, ARTIST_PENALTY, position, artist, best, k)
+        for other, tree in self.trees.items():
+            if other == genre:
+                continue
+            if len(best) >= k and GENRE_PENALTY + ARTIST_PENALTY >= -best[0][0]:
+                break
+            self._search(tree, target, GENRE_PENALTY + ARTIST_PENALTY, position, artist, best, k)
+
+        return [(cols.album_id[p], round(math.sqrt(-d), 4)) for d, p in sorted(best, key=lambda e: (-e[0], e[1]))]
+
+_index: Index | None = None
+_refresh_lock = threading.Lock()
+_rebuilding: threading.Thread | None = None
+
+def _rebuild() -> Index:
+    global _index
+    with _refresh_lock:
+        cols = analytics.current_columns()
+        if _index is None or _index.columns is not cols:
+            index = Index(cols)
+            if len(index.vectors) <= PRECOMPUTE_ALBUMS:
+                index.precompute()
+            _index = index
+        return _index
+
+def _rebuild_in_background() -> None:
+    global _rebuilding
+    with _refresh_lock:
+        if _rebuilding is not None:
+            return
+
+        def run():
+            global _rebuilding
+            try:
+                _rebuild()
+            finally:
+                _rebuilding = None
+
+        _rebuilding = threading.Thread(target=run, name="similar-rebuild", daemon=True)
+        _rebuilding.start()
+
+def current_index(wait: bool = False) -> Index:
+    """
+    This worker's index, rebuilt whenever the analytics columns are.
+
+    Once the catalog version moves on, the old index keeps answering while a
+    background thread rebuilds it, so no request pays for the rebuild. Only
+    the first build, and callers passing wait=True, block until it is done.
+    """
+    index = _index
+    if index is not None and index.columns.version >= current_version():
+        return index
+    if index is None or wait:
+        return _rebuild()
+    _rebuild_in_background()
+    return index
@@ -23,7 +23,4 @@ def load_songs_from_csv(filepath: str) -> list[Song]:
                 songs.append(song)
     except FileNotFoundError:
         print(f"File {filepath} not found")
-    return songs
-
-# Load the songs from CSV
-songsTest: list[Song] = load_songs_from_csv('songs.csv')
\ No newline at end of file
+    return songs
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""
+Shared fixtures. The app is pointed at a throwaway database, seeded from the
+shipped songs.csv, before any application module is imported.
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="albums-tests-")
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORK_DIR, 'albums.db')}")
+os.environ.setdefault("IMAGE_STATIC_DIR", os.path.join(ROOT, "static"))
+os.environ.setdefault("IMAGE_CACHE_DIR", os.path.join(WORK_DIR, "images"))
+os.environ.setdefault("METRICS_DIR", os.path.join(WORK_DIR, "metrics"))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import event
+
+from bootstrap import bootstrap
+from models import engine, read_engine
+
+bootstrap(songs_path=os.path.join(ROOT, "songs.csv"))
+
+@contextmanager
+def count_queries(*binds):
+    """
+    Record every SQL statement executed inside the block, on both engines
+    unless others are given.
+
+        with count_queries() as statements:
+            client.get("/albums")
+        assert len(statements) <= 3
+    """
+    binds = binds or (engine, read_engine)
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for bind in binds:
+        event.listen(bind, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for bind in binds:
+            event.remove(bind, "before_cursor_execute", before_cursor_execute)
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,71 @@
+import statistics
+from collections import defaultdict
+
+import pytest
+from sqlalchemy import select
+
+import analytics
+from models import read_engine, AlbumDB, SongDB
+
+@pytest.mark.parametrize("path", ["/analytics/albums/histogram", "/analytics/songs/histogram"])
+@pytest.mark.parametrize("bounds", ["min=nan", "max=inf", "min=-inf&max=10", "min=5&max=5", "min=9&max=1"])
+def test_histogram_rejects_bad_bounds(client, path, bounds):
+    assert client.get(f"{path}?{bounds}").status_code == 400
+
+@pytest.mark.parametrize("path", ["/analytics/albums/histogram", "/analytics/songs/histogram"])
+def test_histogram_accepts_bounds(client, path):
+    histogram = client.get(f"{path}?min=0&max=100&bins=4").json()
+    assert histogram["edges"] == [0, 25, 50, 75, 100]
+    assert sum(histogram["counts"]) <= histogram["count"]
+
+def summarize(values):
+    mean = statistics.fmean(values)
+    return {"mean": round(mean, 4), "min": min(values), "max": max(values),
+            "stddev": round(statistics.pstdev(values, mean), 4)}
+
+def close(actual: dict, expected: dict) -> bool:
+    return actual.keys() == expected.keys() and all(abs(actual[k] - expected[k]) <= 1e-4 for k in actual)
+
+@pytest.mark.parametrize("by", analytics.SONG_GROUPS)
+@pytest.mark.parametrize("genre, year", [(None, None), ("rap", None), (None, 2020), ("pop", 2020)])
+def test_song_groups_match_a_direct_scan(by, genre, year):
+    cols = analytics.load_columns()
+    expected = defaultdict(list)
+    with read_engine.connect() as conn:
+        rows = conn.execute(
+            select(AlbumDB.genre, AlbumDB.year, AlbumDB.artist, AlbumDB.id, SongDB.score)
+            .join(SongDB, SongDB.album_id == AlbumDB.id)
+        )
+        for row in rows:
+            if (genre is None or row.genre == genre) and (year is None or row.year == year):
+                expected[getattr(row, by if by != "album_id" else "id")].append(row.score)
+    groups = analytics.song_groups(cols, by, genre, year)
+    assert [g["key"] for g in groups] == sorted(expected)
+    for group in groups:
+        assert group["count"] == len(expected[group["key"]])
+        assert close(group["score"], summarize(expected[group["key"]])), group
+
+@pytest.mark.parametrize("by", analytics.ALBUM_GROUPS)
+@pytest.mark.parametrize("genre, year", [(None, None), ("rap", None), (None, 2020), ("nope", None)])
+def test_album_groups_match_a_direct_scan(by, genre, year):
+    cols = analytics.load_columns()
+    expected = defaultdict(list)
+    with read_engine.connect() as conn:
+        for album in conn.execute(select(AlbumDB)):
+            if (genre is None or album.genre == genre) and (year is None or album.year == year):
+                expected[getattr(album, by)].append(album)
+    groups = analytics.album_groups(cols, by, genre, year)
+    assert [g["key"] for g in groups] == sorted(expected)
+    for group in groups:
+        albums = expected[group["key"]]
+        assert group["count"] == len(albums)
+        for metric in analytics.ALBUM_METRICS:
+            assert close(group[metric], summarize([getattr(a, metric) for a in albums])), (group, metric)
+
+def test_song_histogram_counts_every_song_in_range():
+    cols = analytics.load_columns()
+    histogram = analytics.song_histogram(cols, bins=7, genre="rap")
+    with read_engine.connect() as conn:
+        scores = conn.execute(select(SongDB.score).where(SongDB.genre == "rap")).scalars().all()
+    assert histogram["count"] == sum(histogram["counts"]) == len(scores)
+    assert (histogram["min"], histogram["max"]) == (min(scores), max(scores))
@@ -0,0 +1,67 @@
+"""Exports stream whole tables, and give their read connection back however the response ends."""
+import gzip
+import json
+from contextlib import nullcontext
+
+import anyio
+import pytest
+from starlette.requests import ClientDisconnect
+
+import export
+from models import read_engine
+
+def test_export_matches_catalog(client):
+    songs = client.get("/songs?fields=id&limit=1000").json()
+    response = client.get("/export/songs", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    # httpx undoes Content-Encoding itself, so check the header and the lines it decoded
+    assert response.headers["content-encoding"] == "gzip"
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in exported][:len(songs)] == [song["id"] for song in songs]
+
+    albums = client.get("/export/albums?format=csv").text.splitlines()
+    assert albums[0].startswith("id,title,artist,")
+    assert len(albums) - 1 == len(client.get("/albums?include=&fields=id&limit=1000").json())
+
+def test_gzip_stream_decodes(client):
+    chunks = list(export.stream(export.album_query(), compress=True, chunk_rows=7))
+    lines = gzip.decompress(b"".join(chunks)).decode().splitlines()
+    assert len(lines) == len(client.get("/albums?include=&fields=id&limit=1000").json())
+
+def test_abandoned_stream_releases_connection():
+    idle = read_engine.pool.checkedout()
+    chunks = export.stream(export.song_query(), chunk_rows=10)
+    next(chunks)
+    assert read_engine.pool.checkedout() == idle + 1
+    chunks.close()
+    assert read_engine.pool.checkedout() == idle
+
+@pytest.mark.parametrize("spec_version", ["2.3", "2.4"])
+def test_disconnected_client_releases_connection(spec_version):
+    """Under ASGI 2.4 a disconnect is a failed send; before that, a cancellation from the disconnect listener."""
+    idle = read_engine.pool.checkedout()
+    scope = {"type": "http", "asgi": {"spec_version": spec_version}}
+    sent = []
+    gone = anyio.Event()
+
+    async def receive():
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            assert read_engine.pool.checkedout() == idle + 1
+            if spec_version == "2.4" and sent:
+                raise OSError("connection reset")
+            gone.set()
+            # the disconnect listener cancels the stream while this send is in flight
+            await anyio.sleep(1)
+        sent.append(message)
+
+    async def respond():
+        response = export.ExportResponse(export.stream(export.song_query(), chunk_rows=10))
+        with pytest.raises(ClientDisconnect) if spec_version == "2.4" else nullcontext():
+            await response(scope, receive, send)
+
+    anyio.run(respond)
+    assert read_engine.pool.checkedout() == idle
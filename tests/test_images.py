@@ -0,0 +1,36 @@
+import os
+
+import images
+
+def test_trim_disk_cache_drops_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(images, "CACHE_DIR", str(tmp_path))
+    for i in range(10):
+        path = tmp_path / f"{i:02d}" / f"{i}.jpg"
+        path.parent.mkdir()
+        path.write_bytes(b"x" * 100)
+        os.utime(path, ns=(i * 10**9, i * 10**9))
+    # a read marks a rendition as recently used
+    os.utime(tmp_path / "00" / "0.jpg")
+
+    assert images.trim_disk_cache(max_bytes=2000) == 0
+    assert images.trim_disk_cache(max_bytes=500) == 600
+    kept = sorted(p.name for p in tmp_path.glob("*/*.jpg"))
+    assert kept == ["0.jpg", "7.jpg", "8.jpg", "9.jpg"]
+
+def test_original_and_rendition_etags(client):
+    original = client.get("/image/1.jpg")
+    assert original.status_code == 200
+    assert client.get("/image/1.jpg", headers={"If-None-Match": original.headers["etag"]}).status_code == 304
+
+    resized = client.get("/image/1.jpg?width=64&format=jpeg")
+    assert resized.status_code == 200 and resized.headers["content-type"] == "image/jpeg"
+    assert resized.headers["etag"] != original.headers["etag"]
+    assert client.get("/image/1.jpg?width=64&format=jpeg",
+                      headers={"If-None-Match": resized.headers["etag"]}).status_code == 304
+
+def test_image_errors(client):
+    assert client.get("/image/nope.jpg").status_code == 404
+    assert client.get("/image/nope.jpg?width=64").status_code == 404
+    assert client.get("/image/1.jpg?width=-5").status_code == 400
+    assert client.get("/image/1.jpg?width=100000&height=100000").status_code == 400
+    assert client.get("/image/1.jpg?format=gif").status_code == 400
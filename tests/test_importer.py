@@ -0,0 +1,61 @@
+"""Bulk import: bad rows are counted and skipped, good ones land, unchanged files are not re-read."""
+import json
+
+import pytest
+from sqlalchemy import create_engine, select
+
+import importer
+from models import AlbumDB, SongDB
+
+ALBUM = {"id": 1, "title": "Album", "artist": "Artist", "year": 2020, "score": 80.0, "genre": "pop"}
+
+@pytest.fixture
+def bind(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'import.db'}")
+    yield engine
+    engine.dispose()
+
+def write_ndjson(path, rows) -> str:
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+    return str(path)
+
+def test_import_round_trip(bind, tmp_path):
+    albums = write_ndjson(tmp_path / "albums.ndjson", [ALBUM, {**ALBUM, "id": 2, "score": 90.0}])
+    songs = tmp_path / "songs.csv"
+    songs.write_text("name,score,album_id\nOne,7.5,1\nTwo,9,2\nTwo,8,2\n")
+    summaries = importer.run([albums], [str(songs)], bind=bind)
+    assert [(s["rows"], s["invalid"]) for s in summaries] == [(2, 0), (3, 0)]
+    with bind.connect() as conn:
+        assert conn.execute(select(AlbumDB.id, AlbumDB.score).order_by(AlbumDB.id)).all() == [(1, 80.0), (2, 90.0)]
+        songs_by_rank = conn.execute(select(SongDB.name, SongDB.album_id).order_by(SongDB.song_rank)).all()
+    assert songs_by_rank == [("Two", 2), ("Two", 2), ("One", 1)]
+
+    # the same file again is skipped; once changed, repeated names update the songs they matched
+    assert importer.run([albums], [str(songs)], bind=bind)[1]["skipped"]
+    songs.write_text("name,score,album_id\nOne,7.5,1\nTwo,6,2\nTwo,5,2\n")
+    assert importer.run([], [str(songs)], bind=bind)[0]["rows"] == 3
+    with bind.connect() as conn:
+        assert conn.execute(select(SongDB.score).where(SongDB.album_id == 2).order_by(SongDB.id)).scalars().all() \
+            == [6.0, 5.0]
+
+@pytest.mark.parametrize("bad", [
+    {"score": "nan"}, {"score": "inf"}, {"personal": "-Infinity"}, {"mean": "NaN"},
+    {"id": 0}, {"id": -1}, {"year": "soon"}, {"genre": "polka"},
+])
+def test_invalid_album_rows_are_counted_and_skipped(bind, tmp_path, bad):
+    albums = write_ndjson(tmp_path / "albums.ndjson", [ALBUM, {**ALBUM, "id": 2, **bad}])
+    [summary] = importer.run([albums], bind=bind)
+    assert (summary["rows"], summary["invalid"]) == (1, 1)
+    assert summary["errors"][0].startswith(f"line 2: bad {next(iter(bad))}")
+    with bind.connect() as conn:
+        assert conn.execute(select(AlbumDB.id)).scalars().all() == [1]
+
+@pytest.mark.parametrize("bad", [{"score": "nan"}, {"score": "1e999"}, {"id": -1}, {"album_id": -1}])
+def test_invalid_song_rows_are_counted_and_skipped(bind, tmp_path, bad):
+    albums = write_ndjson(tmp_path / "albums.ndjson", [ALBUM])
+    songs = write_ndjson(tmp_path / "songs.ndjson", [{"name": "Good", "score": 7.0, "album_id": 1},
+                                                     {"name": "Bad", "score": 7.0, "album_id": 1, **bad}])
+    summaries = importer.run([albums], [songs], bind=bind)
+    assert (summaries[1]["rows"], summaries[1]["invalid"]) == (1, 1)
+    with bind.connect() as conn:
+        assert conn.execute(select(SongDB.name)).scalars().all() == ["Good"]
@@ -0,0 +1,15 @@
+import leaderboard
+from catalog import current_snapshot
+
+def test_filtered_boards_are_bounded(client):
+    for i in range(leaderboard.MAX_CACHED_BOARDS + 50):
+        assert client.get(f"/leaderboard/albums?artist=nobody-{i}").json() == []
+    assert len(leaderboard._boards) == leaderboard.MAX_CACHED_BOARDS
+    # the unfiltered board is never evicted
+    assert leaderboard._overall["albums"] is leaderboard.board(current_snapshot(), "albums", {})
+
+def test_percentile_rejects_non_finite_scores(client):
+    for collection in ("albums", "songs"):
+        assert client.get(f"/leaderboard/{collection}/percentile?score=80").status_code == 200
+        for score in ("nan", "inf", "-inf"):
+            assert client.get(f"/leaderboard/{collection}/percentile?score={score}").status_code == 400
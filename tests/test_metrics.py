@@ -0,0 +1,23 @@
+"""Request metrics and the slow request log."""
+import json
+
+import metrics
+
+def test_slow_requests_are_logged(client, monkeypatch, tmp_path):
+    log = tmp_path / "slow" / "requests.ndjson"
+    monkeypatch.setattr(metrics, "SLOW_REQUEST_MS", 1e-6)
+    monkeypatch.setattr(metrics, "SLOW_REQUEST_LOG", str(log))
+    for album_id in (1, 2):
+        assert client.get(f"/album/{album_id}?include=songs").status_code == 200
+    metrics.flush_slow_requests()
+    records = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [(r["route"], r["path"], r["status"]) for r in records] == [
+        ("/album/{album_id}", "/album/1", 200), ("/album/{album_id}", "/album/2", 200),
+    ]
+    assert all(r["db_statements"] == len(r["slowest_statements"]) > 0 for r in records)
+
+def test_metrics_endpoint_counts_requests(client):
+    client.get("/album/1")
+    body = client.get("/metrics").text
+    assert 'http_requests_total{method="GET",route="/album/{album_id}",status="200"}' in body
+    assert "# TYPE http_request_duration_seconds histogram" in body
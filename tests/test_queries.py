@@ -0,0 +1,31 @@
+"""Query budgets: each album read loads its relationships in one query per relationship, never per album."""
+import pytest
+
+from conftest import count_queries
+
+def table_queries(statements: list[str]) -> list[str]:
+    # the catalog version poll is shared by every endpoint and is not part of any budget
+    return [s for s in statements if "catalog_version" not in s]
+
+@pytest.mark.parametrize("url", ["/albums", "/albums?limit=1000", "/albums?sort=-score&limit=50"])
+def test_albums_query_budget(client, url):
+    with count_queries() as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    assert any(album["songs"] and album["stats"] for album in response.json())
+    # albums, then stats and songs for the whole page
+    assert len(table_queries(statements)) <= 3, statements
+
+def test_album_query_budget(client):
+    with count_queries() as statements:
+        response = client.get("/album/1")
+    assert response.status_code == 200
+    assert response.json()["songs"]
+    assert len(table_queries(statements)) <= 3, statements
+
+def test_include_skips_relationships(client):
+    with count_queries() as statements:
+        response = client.get("/albums?include=&limit=20")
+    assert response.status_code == 200
+    assert all(album["songs"] == [] and album["stats"] == [] for album in response.json())
+    assert len(table_queries(statements)) == 1, statements
@@ -0,0 +1,94 @@
+"""Incremental rank maintenance must always agree with a full bootstrap.compute_ranks."""
+import random
+
+import pytest
+from sqlalchemy import select
+
+from bootstrap import compute_ranks
+from conftest import count_queries
+from models import engine, SongDB, StatsDB
+
+GENRES = ["rap", "pop", "rnb", "edm"]
+# few distinct scores, so ties (broken by id) come up often
+ALBUM_SCORES = [70.0, 75.5, 80.0, 85.25, 90.0]
+SONG_SCORES = [6.0, 7.5, 8.0, 8.5, 9.0]
+
+def ranks(conn) -> tuple[dict, dict]:
+    songs = dict(conn.execute(select(SongDB.id, SongDB.song_rank)).all())
+    stats = {
+        row.album_id: (row.album_rank, row.highest_song_rank, row.rank_in_year, row.rank_in_genre)
+        for row in conn.execute(select(StatsDB.album_id, StatsDB.album_rank, StatsDB.highest_song_rank,
+                                       StatsDB.rank_in_year, StatsDB.rank_in_genre))
+    }
+    return songs, stats
+
+def recomputed_ranks() -> tuple[dict, dict]:
+    """What compute_ranks makes of the current rows, without keeping it."""
+    with engine.connect() as conn:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        compute_ranks(conn)
+        expected = ranks(conn)
+        conn.rollback()
+    return expected
+
+def random_write(client, rng: random.Random, created: list[int]) -> None:
+    album_ids = [album["id"] for album in client.get("/albums?include=&fields=id&limit=1000").json()]
+    song_ids = [song["id"] for song in client.get("/songs?fields=id&limit=1000").json()]
+    op = rng.choice(["create_album", "update_album", "delete_album", "create_song", "update_song", "delete_song"])
+    if op == "create_album" or (op == "delete_album" and not created):
+        response = client.post("/albums", json={
+            "title": f"Test {rng.random()}", "artist": "Test", "year": rng.choice([2019, 2020, 2021]),
+            "score": rng.choice(ALBUM_SCORES), "genre": rng.choice(GENRES),
+        })
+        created.append(response.json()["id"])
+    elif op == "update_album":
+        changes = rng.choice([
+            {"score": rng.choice(ALBUM_SCORES)},
+            {"year": rng.choice([2019, 2020, 2021])},
+            {"genre": rng.choice(GENRES)},
+            {"score": rng.choice(ALBUM_SCORES), "year": rng.choice([2019, 2020]), "genre": rng.choice(GENRES)},
+        ])
+        response = client.patch(f"/album/{rng.choice(album_ids)}", json=changes)
+    elif op == "delete_album":
+        # only albums made here, so the seeded catalog other tests rely on stays
+        response = client.delete(f"/album/{created.pop(rng.randrange(len(created)))}")
+    elif op == "create_song":
+        response = client.post("/songs", json={
+            "name": f"Song {rng.random()}", "score": rng.choice(SONG_SCORES), "album_id": rng.choice(album_ids),
+        })
+    elif op == "update_song":
+        changes = rng.choice([
+            {"score": rng.choice(SONG_SCORES)},
+            {"album_id": rng.choice(album_ids)},
+            {"score": rng.choice(SONG_SCORES), "album_id": rng.choice(album_ids)},
+        ])
+        response = client.patch(f"/songs/{rng.choice(song_ids)}", json=changes)
+    else:
+        response = client.delete(f"/songs/{rng.choice(song_ids)}")
+    assert response.status_code in (200, 201, 204), (op, response.text)
+
+def test_writes_match_compute_ranks(client):
+    rng = random.Random(20240601)
+    created = []
+    for step in range(150):
+        random_write(client, rng, created)
+        if step % 10 == 9:
+            with engine.connect() as conn:
+                actual = ranks(conn)
+            expected = recomputed_ranks()
+            assert actual[0] == expected[0], f"song ranks differ after {step + 1} writes"
+            assert actual[1] == expected[1], f"album stats differ after {step + 1} writes"
+
+@pytest.mark.parametrize("value", ["NaN", "Infinity", "-Infinity", '"nan"'])
+@pytest.mark.parametrize("method, url, body", [
+    ("POST", "/albums", '{"title": "T", "artist": "T", "year": 2020, "genre": "pop", "score": %s}'),
+    ("PATCH", "/album/1", '{"mean": %s}'),
+    ("POST", "/songs", '{"name": "S", "album_id": 1, "score": %s}'),
+    ("PATCH", "/songs/1", '{"score": %s}'),
+])
+def test_non_finite_scores_rejected_before_writing(client, method, url, body, value):
+    # a NaN score would compare false against everything and corrupt every rank around it
+    with count_queries(engine) as statements:
+        response = client.request(method, url, content=body % value, headers={"Content-Type": "application/json"})
+    assert response.status_code == 422, response.text
+    assert statements == []
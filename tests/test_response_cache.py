@@ -0,0 +1,9 @@
+def test_cached_list_is_served_compressed(client):
+    plain = client.get("/albums?limit=500", headers={"Accept-Encoding": "identity"})
+    packed = client.get("/albums?limit=500", headers={"Accept-Encoding": "gzip"})
+    assert packed.headers["content-encoding"] == "gzip"
+    assert int(packed.headers["content-length"]) < len(plain.content)
+    # the client decodes gzip itself
+    assert packed.content == plain.content
+    assert packed.headers["etag"] == plain.headers["etag"]
+    assert client.get("/albums?limit=500", headers={"If-None-Match": plain.headers["etag"]}).status_code == 304
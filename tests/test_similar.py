@@ -0,0 +1,30 @@
+"""Similar albums: a catalog write never makes a request wait for the index rebuild."""
+import time
+
+import similar
+
+def wait_for_rebuild():
+    rebuilding = similar._rebuilding
+    if rebuilding is not None:
+        rebuilding.join()
+
+def test_stale_index_answers_while_rebuilding(client, monkeypatch):
+    assert client.get("/album/1/similar").status_code == 200
+    wait_for_rebuild()
+    before = similar.current_index()
+    built = []
+    monkeypatch.setattr(similar, "Index", lambda cols: built.append(time.sleep(0.2)) or before.__class__(cols))
+
+    album = client.post("/albums", json={"title": "Fresh", "artist": "Test", "year": 2020, "score": 80.0,
+                                         "genre": "pop"}).json()
+    # an album newer than the index waits for the rebuild instead of getting a 404
+    assert client.get(f"/album/{album['id']}/similar?k=3").status_code == 200
+    assert len(built) == 1
+    before = similar.current_index()
+
+    client.delete(f"/album/{album['id']}")
+    started = time.perf_counter()
+    assert client.get("/album/2/similar?k=3").status_code == 200
+    assert time.perf_counter() - started < 0.2
+    wait_for_rebuild()
+    assert len(built) == 2 and similar.current_index() is not before